@@ -1,6 +1,10 @@
+import hashlib
+import os
+import struct
+import zlib
 import numpy as np
-import pandas as pd
 from PIL import Image
+import map_format
 from typing import Union
 
 np.set_printoptions(threshold=np.inf, linewidth=300)
@@ -20,6 +24,8 @@ class Map_Obj():
 
     Methods
     ----------
+    from_array(int_map, start_pos, goal_pos, end_goal_pos)
+        Create a map object from an integer map in memory
     get_cell_value(pos)
         Return the value (cost) of `pos`
     get_start_pos()
@@ -30,7 +36,19 @@ class Map_Obj():
         Get the end goal position (for moving task)
     get_maps()
         Get integer and string maps
+    get_neighbor_graph(connectivity)
+        Get the precomputed neighbor table (CSR) of the map
+    get_map_hash()
+        Get a content hash of the integer map
+    get_map_version()
+        Get the number of cell changes made to the map
+    get_min_cost()
+        Get the value (cost) of the cheapest open cell of the map
     """
+    # Whether searches should only keep state for the cells they touch
+    # (see TiledMap), instead of flat arrays over the whole map
+    sparse_search = False
+
     def __init__(self, task: int = 1) -> None:
         """Instantiate a map object for task number `task`.
 
@@ -41,11 +59,75 @@ class Map_Obj():
         """
         self.start_pos, self.goal_pos, self.end_goal_pos, \
             self.path_to_map = self.fill_critical_positions(task)
-        self.int_map, self.str_map = self.read_map(self.path_to_map)
+        self._init_map(self.load_int_map(self.path_to_map))
+
+    @classmethod
+    def from_array(cls, int_map: np.ndarray, start_pos: list[int, int],
+                   goal_pos: list[int, int],
+                   end_goal_pos: list[int, int] = None) -> 'Map_Obj':
+        """Instantiate a map object from an integer map that is
+        already in memory, instead of from a task.
+
+        Parameters
+        ----------
+        int_map : np.ndarray
+            The map as an ndarray of integers (used, not copied)
+        start_pos : list[int, int]
+            Start position
+        goal_pos : list[int, int]
+            Initial goal position
+        end_goal_pos : list[int, int], optional
+            End goal position, by default the goal does not move
+
+        Returns
+        -------
+        Map_Obj
+            A map object for the given map and positions
+        """
+        map_obj = cls.__new__(cls)
+        # Positions may be arrays (or hold numpy integers), stored as lists of ints
+        map_obj.start_pos = [int(v) for v in start_pos]
+        map_obj.goal_pos = [int(v) for v in goal_pos]
+        map_obj.end_goal_pos = [int(v) for v in (goal_pos if end_goal_pos is None else end_goal_pos)]
+        map_obj.path_to_map = None
+        map_obj._init_map(int_map)
+        return map_obj
+
+    def _init_map(self, int_map: np.ndarray):
+        """Set up the map state shared by all constructors."""
+        self.int_map = int_map
+        # The string map is only built when it is first used
+        self._str_map = None
         self.tmp_cell_value = self.get_cell_value(self.goal_pos)
-        self.set_cell_value(self.start_pos, ' S ')
-        self.set_cell_value(self.goal_pos, ' G ')
         self.tick_counter = 0
+        # Neighbor tables are built once per connectivity and kept
+        # up to date when cell costs change
+        self.neighbor_graphs = {}
+        if not self.sparse_search:
+            self.get_neighbor_graph(4)
+        # Callbacks to notify when the value (cost) of a cell changes
+        self.change_listeners = []
+        # Number of cell changes, and the content hash of the map at
+        # the version it was last computed for
+        self.version = 0
+        self._hash = None
+        self._hash_version = -1
+        self._min_cost = None
+        self._min_cost_version = -1
+
+    @property
+    def str_map(self) -> np.ndarray:
+        """The map as an array of symbols, with the start and goal
+        marked. Built from the integer map the first time it is used."""
+        if self._str_map is None:
+            self._str_map = self.build_str_map(self.int_map)
+            self._str_map[self.start_pos[0], self.start_pos[1]] = ' S '
+            self._str_map[self.goal_pos[0], self.goal_pos[1]] = ' G '
+        return self._str_map
+
+    @str_map.setter
+    def str_map(self, value: np.ndarray):
+        self._str_map = value
 
     def read_map(self, path: str) -> tuple[np.ndarray, str]:
         """
@@ -56,7 +138,7 @@ class Map_Obj():
         Parameters
         ----------
         path : str
-            Path to the map file (CSV)
+            Path to the map file (CSV or binary)
 
         Returns
         -------
@@ -64,22 +146,64 @@ class Map_Obj():
             A tuple of the map as an ndarray of integers,
             and the map as a string of symbols.
         """
-        # Read map from provided csv file
-        df = pd.read_csv(path, index_col=None,
-                         header=None)  # ,error_bad_lines=False)
-        # Convert pandas dataframe to numpy array
-        data = df.values
-        # Convert numpy array to string to make it more human readable
-        data_str = data.astype(str)
-        # Replace numeric values with more human readable symbols
-        data_str[data_str == '-1'] = ' # '
-        data_str[data_str == '1'] = ' . '
-        data_str[data_str == '2'] = ' , '
-        data_str[data_str == '3'] = ' : '
-        data_str[data_str == '4'] = ' ; '
-        data_str[data_str == '5'] = ' - '
-        data_str[data_str == '6'] = ' x '
-        return data, data_str
+        data = self.load_int_map(path)
+        return data, self.build_str_map(data)
+
+    def load_int_map(self, path: str) -> np.ndarray:
+        """
+        Loads the integer map specified in path. Binary maps (see
+        map_format.py) are memory-mapped instead of parsed, and are
+        also used for a CSV path if an up to date binary map with the
+        same name exists next to it. CSV maps are read as int64, while
+        binary maps are int8 (as stored in the file), so cell values
+        should be converted with int() before doing cost arithmetic.
+
+        Parameters
+        ----------
+        path : str
+            Path to the map file (CSV or binary)
+
+        Returns
+        -------
+        np.ndarray
+            The map as an ndarray of integers (int64, or int8 for a
+            binary map)
+        """
+        binary = map_format.binary_path(path)
+        if path == binary or (os.path.exists(binary) and
+                              os.path.getmtime(binary) >=
+                              os.path.getmtime(path)):
+            return map_format.load_map(binary)
+
+        # Read map from provided csv file, a chunk of rows at a time
+        return map_format.read_csv(path)
+
+    def build_str_map(self, int_map: np.ndarray) -> np.ndarray:
+        """
+        Converts an integer map to a string array, replacing the
+        values with human readable symbols.
+
+        Parameters
+        ----------
+        int_map : np.ndarray
+            The map as an ndarray of integers
+
+        Returns
+        -------
+        np.ndarray
+            The map as an array of symbols
+        """
+        # Symbols of the values -1 to 6
+        symbols = np.array([' # ', '0', ' . ', ' , ', ' : ', ' ; ',
+                            ' - ', ' x '])
+        int_map = np.asarray(int_map)
+        known = (int_map >= -1) & (int_map <= 6)
+        if known.all():
+            return symbols[int_map + 1]
+        # Values without a symbol are kept as numbers
+        data_str = int_map.astype(str)
+        data_str[known] = symbols[int_map[known] + 1]
+        return data_str
 
     def fill_critical_positions(self, task: int) -> tuple[list[int], list[int],
                                                           list[int], str]:
@@ -159,9 +283,145 @@ class Map_Obj():
         cells = list(filter(lambda item: self.int_map[item[0], item[1]] != -1, cells))
         return cells
 
+    def build_neighbor_graph(self, connectivity: int = 4) -> tuple[
+            np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Build a compressed sparse row (CSR) table of all valid
+        neighbors of every cell. The neighbors of the cell with flat
+        index `i = row * width + col` are
+        `targets[offsets[i]:offsets[i + 1]]`, in the same order as
+        `get_cell_neighbors` / `get_cell_neighbors_8` returns them, and
+        the cost of moving to each of them is stored in `costs`.
+
+        Parameters
+        ----------
+        connectivity : int, optional
+            4 or 8 connectedness, by default 4
+
+        Returns
+        -------
+        tuple[np.ndarray, np.ndarray, np.ndarray]
+            offsets (int32, length height * width + 1),
+            targets (int32, flat cell indices),
+            costs (int32, the value of every target cell)
+        """
+        if connectivity == 4:
+            moves = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+        elif connectivity == 8:
+            moves = [(i - 1, j - 1) for i in range(3) for j in range(3)
+                     if (i, j) != (1, 1)]
+        else:
+            raise ValueError('connectivity must be 4 or 8, not '
+                             + str(connectivity))
+
+        height, width = self.int_map.shape
+        open_cells = self.int_map != -1
+        rows, cols = np.indices((height, width))
+        flat = rows * width + cols
+
+        # For every move, find which cells can make it and where it leads
+        valid = np.zeros((height, width, len(moves)), dtype=bool)
+        target = np.zeros((height, width, len(moves)), dtype=np.int32)
+        for k, (dr, dc) in enumerate(moves):
+            r, c = rows + dr, cols + dc
+            inside = (r >= 0) & (r < height) & (c >= 0) & (c < width)
+            r, c = np.clip(r, 0, height - 1), np.clip(c, 0, width - 1)
+            valid[:, :, k] = open_cells & inside & open_cells[r, c]
+            target[:, :, k] = flat[r, c]
+
+        # Boolean indexing keeps row-major order, i.e. grouped by source
+        offsets = np.zeros(height * width + 1, dtype=np.int32)
+        np.cumsum(valid.sum(axis=2).ravel(), out=offsets[1:])
+        targets = target[valid].astype(np.int32)
+        costs = self.int_map.ravel()[targets].astype(np.int32)
+        return offsets, targets, costs
+
+    def get_map_hash(self) -> str:
+        """Content hash of the integer map (its shape and values), to
+        key data computed from the map, such as caches on disk. The
+        hash is only computed again after the map changed (see
+        `get_map_version`)."""
+        if self._hash_version != self.version:
+            digest = hashlib.blake2b(digest_size=16)
+            digest.update(str(self.int_map.shape).encode())
+            digest.update(np.ascontiguousarray(self.int_map,
+                                               dtype=np.int16).tobytes())
+            self._hash, self._hash_version = digest.hexdigest(), self.version
+        return self._hash
+
+    def get_min_cost(self) -> int:
+        """Getter for the value (cost) of the cheapest open cell of
+        the map, e.g. to scale heuristics. It is only computed again
+        after the map changed (see `get_map_version`)."""
+        if self._min_cost_version != self.version:
+            self._min_cost = self._find_min_cost()
+            self._min_cost_version = self.version
+        return self._min_cost
+
+    def _find_min_cost(self) -> int:
+        """Compute the value of the cheapest open cell of the map."""
+        return int(self.int_map[self.int_map != -1].min())
+
+    def get_map_version(self) -> int:
+        """Getter for the version of the map, which goes up by one
+        every time the value (cost) of a cell changes through
+        `set_cell_value` or `replace_map_values`."""
+        return self.version
+
+    def get_neighbor_graph(self, connectivity: int = 4) -> tuple[
+            np.ndarray, np.ndarray, np.ndarray]:
+        """Getter for the neighbor table of the map, see
+        `build_neighbor_graph`. The table is only built the first time
+        it is requested for a connectivity."""
+        if connectivity not in self.neighbor_graphs:
+            self.neighbor_graphs[connectivity] = \
+                self.build_neighbor_graph(connectivity)
+        return self.neighbor_graphs[connectivity]
+
+    def add_change_listener(self, listener: callable):
+        """Register `listener` to be called as
+        `listener(pos, old_value, new_value)` every time the value
+        (cost) of a cell in the integer map changes."""
+        self.change_listeners.append(listener)
+
+    def remove_change_listener(self, listener: callable):
+        """Stop notifying `listener` of changed cells."""
+        self.change_listeners.remove(listener)
+
+    def _cell_changed(self, pos: list[int, int], old_value: int):
+        """Keep the neighbor tables in sync and notify the listeners
+        after the value of the cell at `pos` has changed from
+        `old_value`. Listeners get the values as Python ints, since
+        the map may hold narrow integers (e.g. int8) that overflow in
+        cost arithmetic."""
+        old_value = int(old_value)
+        value = int(self.int_map[pos[0], pos[1]])
+        if value == old_value:
+            return
+        self.version += 1
+        self._update_neighbor_graphs(pos, old_value, value)
+        for listener in self.change_listeners:
+            listener([pos[0], pos[1]], old_value, value)
+
+    def _update_neighbor_graphs(self, pos: list[int, int], old_value: int,
+                                value: int):
+        """Update the neighbor tables after the value of the cell at
+        `pos` has changed from `old_value` to `value`."""
+        # Walls added or removed change the structure, so rebuild lazily
+        if value == -1 or old_value == -1:
+            self.neighbor_graphs.clear()
+            return
+        # Otherwise only the cost of the edges going into `pos` changes
+        width = self.int_map.shape[1]
+        index = pos[0] * width + pos[1]
+        for offsets, targets, costs in self.neighbor_graphs.values():
+            for source in targets[offsets[index]:offsets[index + 1]]:
+                start, stop = offsets[source], offsets[source + 1]
+                costs[start:stop][targets[start:stop] == index] = value
+
     def get_cell_value(self, pos: list[int, int]) -> int:
         """Getter for the value (cost) of the cell at `pos`"""
-        return self.int_map[pos[0], pos[1]]
+        return int(self.int_map[pos[0], pos[1]])
 
     def get_goal_pos(self) -> list[int, int]:
         """Getter for the goal position of the current task"""
@@ -214,30 +474,57 @@ class Map_Obj():
         if str_map:
             self.str_map[pos[0], pos[1]] = value
         else:
+            old_value = self.int_map[pos[0], pos[1]]
             self.int_map[pos[0], pos[1]] = value
+            self._cell_changed(pos, old_value)
 
     def print_map(self, map_to_print: Union[np.ndarray, str]):
         """Helper function to print `map_to_print` in the console"""
         for column in map_to_print:
             print(column)
 
-    def pick_move(self) -> list[int, int]:
+    def pick_move(self, pos: list[int, int] = None) -> list[int, int]:
         """
         Calculate new end_goal position based on the current position.
 
+        Parameters
+        ----------
+        pos : list[int, int], optional
+            Position to move from, by default the current goal position
+
         Returns
         -------
         pos : list[int, int]
             New position of the goal.
         """
-        if self.goal_pos[0] < self.end_goal_pos[0]:
-            return [self.goal_pos[0] + 1, self.goal_pos[1]]
-        elif self.goal_pos[0] > self.end_goal_pos[0]:
-            return [self.goal_pos[0] - 1, self.goal_pos[1]]
-        elif self.goal_pos[1] < self.end_goal_pos[1]:
-            return [self.goal_pos[0], self.goal_pos[1] + 1]
+        if pos is None:
+            pos = self.goal_pos
+        if pos[0] < self.end_goal_pos[0]:
+            return [pos[0] + 1, pos[1]]
+        elif pos[0] > self.end_goal_pos[0]:
+            return [pos[0] - 1, pos[1]]
+        elif pos[1] < self.end_goal_pos[1]:
+            return [pos[0], pos[1] + 1]
         else:
-            return [self.goal_pos[0], self.goal_pos[1] - 1]
+            return [pos[0], pos[1] - 1]
+
+    def get_goal_trajectory(self) -> list[list[int, int]]:
+        """
+        Predict every position the goal will visit, from the current
+        goal position to the end goal position (both included), as
+        chosen by `pick_move`.
+
+        Returns
+        -------
+        list[list[int, int]]
+            The positions of the goal in the order they are visited
+        """
+        trajectory = [list(self.goal_pos)]
+        if self.end_goal_pos is None:
+            return trajectory
+        while trajectory[-1] != list(self.end_goal_pos):
+            trajectory.append(self.pick_move(trajectory[-1]))
+        return trajectory
 
     def replace_map_values(self, pos: list[int, int], value: int,
                            goal_pos: list[int, int]):
@@ -263,9 +550,13 @@ class Map_Obj():
             str_value = ' ; '
         else:
             str_value = str(value)
+        old_value = self.int_map[pos[0]][pos[1]]
         self.int_map[pos[0]][pos[1]] = value
-        self.str_map[pos[0]][pos[1]] = str_value
-        self.str_map[goal_pos[0], goal_pos[1]] = ' G '
+        self._cell_changed(pos, old_value)
+        # An unbuilt string map will be built from the updated values
+        if self._str_map is not None:
+            self._str_map[pos[0]][pos[1]] = str_value
+            self._str_map[goal_pos[0], goal_pos[1]] = ' G '
 
     def tick(self) -> list[int, int]:
         """
@@ -334,17 +625,24 @@ class Map_Obj():
         else:
             themap[goal_pos[0]][goal_pos[1]] = ' G '
 
-    def show_map(self, themap: Union[np.ndarray, str] = None):
-        image = self.get_map_image(themap)
+    def show_map(self, themap: Union[np.ndarray, str] = None,
+                 scale: int = 20):
+        image = self.get_map_image(themap, scale)
         image.show()
 
-    def get_map_image(self, themap: Union[np.ndarray, str] = None):
-        """Draws `themap` as an image and shows it.
+    def get_map_colors(self, themap: Union[np.ndarray, str] = None
+                       ) -> np.ndarray:
+        """Looks up the color of every cell of `themap`.
 
         Parameters
         ----------
         themap : np.ndarray or str, optional
-            The map to show. By default uses the string map
+            The map to color. By default uses the string map
+
+        Returns
+        -------
+        np.ndarray
+            The colors as a (height, width, 3) array of uint8
         """
         # If a map is provided, set the goal and start positions
         if themap is not None:
@@ -353,40 +651,89 @@ class Map_Obj():
         # If no map is provided, use string_map
         else:
             themap = self.str_map
+        themap = np.asarray(themap)
+
+        # Give every distinct symbol its color (undefined symbols
+        # remain yellow, this is how the yellow path is painted),
+        # and look the colors up for all cells at once
+        symbols, inverse = np.unique(themap, return_inverse=True)
+        palette = np.array([MAP_COLORS.get(symbol, (255, 255, 0))
+                            for symbol in symbols], dtype=np.uint8)
+        return palette[inverse.reshape(themap.shape)]
+
+    def get_map_image(self, themap: Union[np.ndarray, str] = None,
+                      scale: int = 20) -> Image.Image:
+        """Draws `themap` as an image and returns it.
 
-        # Define width and height of image
-        width = themap.shape[1]
-        height = themap.shape[0]
-        # Define scale of the image
-        scale = 20
-        # Create an all-yellow image
-        image = Image.new('RGB', (width * scale, height * scale),
-                          (255, 255, 0))
-        # Load image
-        pixels = image.load()
-
-        # Define what colors to give to different values of the string map
-        # (undefined values will remain yellow, this is
-        # how the yellow path is painted)
-        colors = {
-            ' # ': (211, 33, 45),  # redish
-            ' . ': (215, 215, 215),  # whiteish
-            ' , ': (166, 166, 166),  # lightgrey
-            ' : ': (96, 96, 96),   # darkgrey
-            ' ; ': (36, 36, 36),   # blackish
-            ' S ': (255, 0, 255),  # magenta
-            ' G ': (0, 128, 255),   # cyan
-            ' - ': (230, 139, 21),   # exploration
-            ' x ': (80, 255, 150),   # path
-        }
-        # Go through image and set pixel color for every position
-        for y in range(height):
-            for x in range(width):
-                if themap[y][x] not in colors:
-                    continue
-                for i in range(scale):
-                    for j in range(scale):
-                        pixels[x * scale + i,
-                               y * scale + j] = colors[themap[y][x]]
-        # Show image
-        return image
+        Parameters
+        ----------
+        themap : np.ndarray or str, optional
+            The map to show. By default uses the string map
+        scale : int, optional
+            Width and height of every cell in pixels, by default 20
+        """
+        colors = self.get_map_colors(themap)
+        # Scale every cell up to a scale x scale square
+        pixels = np.repeat(np.repeat(colors, scale, axis=0), scale, axis=1)
+        return Image.fromarray(pixels, 'RGB')
+
+    def save_map_image(self, file, themap: Union[np.ndarray, str] = None,
+                       scale: int = 20):
+        """Writes `themap` as a PNG image, one row of cells at a time, so
+        the full size image is never held in memory.
+
+        Parameters
+        ----------
+        file : str or file object
+            Path or (binary) file object to write the PNG to
+        themap : np.ndarray or str, optional
+            The map to save. By default uses the string map
+        scale : int, optional
+            Width and height of every cell in pixels, by default 20
+        """
+        colors = self.get_map_colors(themap)
+        height, width = colors.shape[:2]
+
+        def rows():
+            for row in colors:
+                # Filter type 0 (none), then the scaled row of pixels
+                line = b'\x00' + np.repeat(row, scale, axis=0).tobytes()
+                yield line * scale
+
+        if isinstance(file, str):
+            with open(file, 'wb') as f:
+                _write_png(f, width * scale, height * scale, rows())
+        else:
+            _write_png(file, width * scale, height * scale, rows())
+
+
+# Define what colors to give to different values of the string map
+MAP_COLORS = {
+    ' # ': (211, 33, 45),  # redish
+    ' . ': (215, 215, 215),  # whiteish
+    ' , ': (166, 166, 166),  # lightgrey
+    ' : ': (96, 96, 96),   # darkgrey
+    ' ; ': (36, 36, 36),   # blackish
+    ' S ': (255, 0, 255),  # magenta
+    ' G ': (0, 128, 255),   # cyan
+    ' - ': (230, 139, 21),   # exploration
+    ' x ': (80, 255, 150),   # path
+}
+
+
+def _write_png(f, width: int, height: int, rows):
+    """Write an 8-bit RGB PNG to the file object `f`, compressing the
+    (already filtered) scanline bytes from `rows` as they come."""
+    def chunk(kind: bytes, data: bytes):
+        f.write(struct.pack('>I', len(data)) + kind + data)
+        f.write(struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff))
+
+    f.write(b'\x89PNG\r\n\x1a\n')
+    chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+    compressor = zlib.compressobj()
+    for data in rows:
+        compressed = compressor.compress(data)
+        if compressed:
+            chunk(b'IDAT', compressed)
+    chunk(b'IDAT', compressor.flush())
+    chunk(b'IEND', b'')
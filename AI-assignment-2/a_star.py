@@ -1,95 +1,724 @@
 from Map import Map_Obj
-from queue import PriorityQueue
-from typing import Callable
+from frontier import IndexedHeap
+from search_state import SearchState, SparseArray
+from search_stats import SearchStats
+from typing import Callable, Iterable, Union
+import math
+import time
 import numpy as np
 from PIL import Image
 
+# Values of the overlay a headless search records its cells in
+EXPLORED = 1
+PATH = 2
+
+SQRT2_MINUS_1 = math.sqrt(2) - 1
+
+
+# Built-in heuristic functions, taking two cells (a, b)
+def manhattan(a, b) -> float:
+    """Exact distance without walls for 4-connectedness, when every cell costs 1."""
+    return abs(a[0]-b[0]) + abs(a[1]-b[1])
+
+def chebyshev(a, b) -> float:
+    """Exact distance without walls for 8-connectedness, when every cell costs 1 (diagonal moves cost the same)."""
+    return max(abs(a[0]-b[0]), abs(a[1]-b[1]))
+
+def octile(a, b) -> float:
+    """Distance when diagonal moves cost sqrt(2). Not admissible for Map_Obj, where diagonal moves cost 1."""
+    dr, dc = abs(a[0]-b[0]), abs(a[1]-b[1])
+    return max(dr, dc) + SQRT2_MINUS_1*min(dr, dc)
+
+def euclidean(a, b) -> float:
+    """Straight-line distance."""
+    return math.hypot(a[0]-b[0], a[1]-b[1])
+
+def zero(a, b) -> float:
+    """No heuristic, which turns A* into Dijkstra."""
+    return 0
+
+HEURISTICS = {
+    'manhattan': manhattan,
+    'chebyshev': chebyshev,
+    'octile': octile,
+    'euclidean': euclidean,
+    'zero': zero,
+}
+
+# The same heuristics for whole arrays of row and column distances
+_HEURISTIC_GRIDS = {
+    'manhattan': lambda dr, dc: dr + dc,
+    'chebyshev': np.maximum,
+    'octile': lambda dr, dc: np.maximum(dr, dc) + SQRT2_MINUS_1*np.minimum(dr, dc),
+    'euclidean': np.hypot,
+    'zero': lambda dr, dc: np.zeros(dr.shape),
+}
+
+
+def heuristic_grid(heuristic: Union[str, Callable], goal, shape: tuple, scale: float = 1.0) -> np.ndarray:
+    """
+    Computes a heuristic from every cell of a map to the goal at once. \\
+    params:
+        - heuristic:
+            - the name of a built-in heuristic, or a heuristic function that also works on arrays,
+              i.e. heuristic((rows, cols), goal) with rows and cols being arrays of cell indices.
+        - goal:
+            - the goal cell.
+        - shape:
+            - the (height, width) of the map.
+        - scale:
+            - a factor to multiply the heuristic with.
+    """
+    rows, cols = np.indices(shape)
+    if isinstance(heuristic, str):
+        grid = _HEURISTIC_GRIDS[heuristic](np.abs(rows - goal[0]), np.abs(cols - goal[1]))
+    else:
+        grid = np.broadcast_to(heuristic((rows, cols), goal), shape)
+    return grid * scale
+
+
+def get_heuristic(heuristic: Union[str, Callable], map: Map_Obj = None, grid: bool = False) -> Callable:
+    """
+    Turns a heuristic (function or name) into a heuristic function. \\
+    params:
+        - heuristic:
+            - a heuristic function, e.g. heuristic(cellA, cellB), or the name of a built-in heuristic
+              (see HEURISTICS). A name ending in '_cost', e.g. 'manhattan_cost', is scaled with the cost of
+              the cheapest cell of the map, which keeps it admissible but makes it tighter on expensive terrain.
+        - map:
+            - the Map_Obj the heuristic is used on. Needed for '_cost' heuristics and grids.
+        - grid:
+            - if True, the heuristic is computed for all cells at once (see heuristic_grid) the first time a goal is
+              seen, and only looked up after that.
+    """
+    scale = 1.0
+    if isinstance(heuristic, str) and heuristic.endswith('_cost'):
+        heuristic = heuristic[:-len('_cost')]
+        scale = float(map.get_min_cost())
+    if isinstance(heuristic, str) and heuristic not in HEURISTICS:
+        raise ValueError('unknown heuristic ' + repr(heuristic) + ', use one of ' + ', '.join(HEURISTICS))
+
+    if grid:
+        cache = {}
+
+        def grid_heuristic(a, b):
+            if cache.get('goal') != (b[0], b[1]):
+                cache['goal'] = (b[0], b[1])
+                cache['grid'] = heuristic_grid(heuristic, b, map.int_map.shape, scale).tolist()
+            return cache['grid'][a[0]][a[1]]
+        return grid_heuristic
+
+    function = HEURISTICS[heuristic] if isinstance(heuristic, str) else heuristic
+    if scale == 1.0:
+        return function
+    return lambda a, b: function(a, b)*scale
+
 
 class AStar:
-    def __init__(self, map: Map_Obj) -> None:
+    def __init__(self, map: Map_Obj, connectivity: int = 4, headless: bool = False) -> None:
         """
         Initializes the A*-algorithm, using a Map_Obj. \\
         params:
             - map:
                 - the Map_Obj to find the shortest path of, given a start and a goal.
+            - connectivity:
+                - 4 or 8, whether to move only straight or also diagonally between cells.
+            - headless:
+                - if True, the search does not draw on the map while it runs. Explored cells and the path are only
+                  recorded in an overlay (one byte per cell), and drawn on the map by show_path/get_image/draw.
         """
         # Get start and stop from map
         self.start = map.get_start_pos()
         self.stop = map.get_goal_pos()
+        self.connectivity = connectivity
 
-        # Setup cost and parent matrices
-        self.parent = np.zeros((map.int_map.shape[0], map.int_map.shape[1], 2))-1
-        self.cost = np.zeros((map.int_map.shape[0], map.int_map.shape[1]))-1
+        # Setup the search state (cost, parent and closed set of every cell, by flat index)
+        self.width = map.int_map.shape[1]
+        self.sparse = map.sparse_search
+        self.state = SearchState(map.int_map.size, sparse=self.sparse)
 
         # Start should have 0 accumulative cost
-        self.cost[self.start[0], self.start[1]] = 0
+        self.state.open(self.start[0]*self.width + self.start[1], 0)
 
-        # Initialize queue and add starting cell
-        self.frontier = PriorityQueue()
-        self.frontier.put((1, self.start))
+        # Initialize frontier (keyed on flat cell index) and add starting cell
+        self.frontier = IndexedHeap(map.int_map.size, self.sparse)
+        self.frontier.push(self.start[0]*self.width + self.start[1], 1)
 
         self.map = map
 
-    def find_shortest_path(self, heuristic: Callable, heuristic_weight: float = 1.0):
+        # Overlay of explored cells and path (flat index), used instead of the string map when headless
+        self.headless = headless
+        self.explored = SparseArray(0) if self.sparse else bytearray(map.int_map.size)
+
+        # Number of cells taken out of the frontier by the last search
+        self.expanded = 0
+
+        # State of find_paths, allocated on the first batch
+        self._batch_state = None
+
+    @property
+    def cost(self) -> np.ndarray:
+        """The cost of every cell found by the search, as a matrix with -1 for cells that were not reached."""
+        return self.state.costs().reshape(self.map.int_map.shape)
+
+    @property
+    def parent(self) -> np.ndarray:
+        """The parent of every cell found by the search, as flat indices (row*width + col), -1 if there is none."""
+        return self.state.parents()
+
+    @property
+    def path(self) -> np.ndarray:
+        """The path found to the goal, as an int32 array of shape (n, 2) going from start to goal, empty if none."""
+        return self._cells(self.state.path(self.stop[0]*self.width + self.stop[1]))
+
+    def find_shortest_path(self, heuristic: Union[str, Callable], heuristic_weight: float = 1.0, use_graph: bool = False,
+                           use_heuristic_grid: bool = False, bidirectional: bool = False,
+                           stats: SearchStats = None) -> SearchStats:
         """
         Finds the shortest path of the map, and draws it on the map. \\
         params:
-            - heuristic: 
+            - heuristic:
                 - the heuristic function to use. Must take in two cells, e.g. heuristic(cellA, cellB).
-            - heuristic_weight: 
+                  Can also be the name of a built-in heuristic, see get_heuristic.
+            - heuristic_weight:
                 - a float value specifying how much to weight the heuristic (compared to the cell cost)
+            - use_graph:
+                - if True, walk the precomputed neighbor table of the map (see Map_Obj.get_neighbor_graph)
+                  instead of generating and filtering the neighbors of every expanded cell.
+            - use_heuristic_grid:
+                - if True, compute the heuristic for all cells at once per goal, see get_heuristic.
+            - bidirectional:
+                - if True, search from the start and from the goal at the same time, until the two searches meet
+                  (see _search_bidirectional). Only for tasks where the goal does not move, and always optimal:
+                  heuristic_weight must be 1, and the heuristic consistent (e.g. 'manhattan', or 'zero' for
+                  bidirectional Dijkstra).
+            - stats:
+                - the SearchStats to fill in, e.g. SearchStats(timings=True). By default a new one.
+        returns:
+            - the SearchStats of the search.
         """
+        stats = stats or SearchStats()
+        if bidirectional:
+            if heuristic_weight != 1.0:
+                raise ValueError('bidirectional search does not support a heuristic_weight other than 1')
+            stats.begin('bidirectional')
+            # One heuristic per direction, so each keeps its own grid (if any)
+            self._search_bidirectional(stats.timed(get_heuristic(heuristic, self.map, use_heuristic_grid), 'heuristic'),
+                                       stats.timed(get_heuristic(heuristic, self.map, use_heuristic_grid), 'heuristic'),
+                                       stats)
+        else:
+            stats.begin('astar_graph' if use_graph else 'astar')
+            heuristic = stats.timed(get_heuristic(heuristic, self.map, use_heuristic_grid), 'heuristic')
+            if use_graph:
+                self._search_graph(heuristic, heuristic_weight, stats)
+            else:
+                self._search_cells(heuristic, heuristic_weight, stats)
+        stats.end(self.expanded, self.state.cost(self.stop[0]*self.width + self.stop[1]))
+        self._paint_path()
+        return stats
+
+    def _paint_path(self):
+        """Follows the parents from the goal back to the start, and draws the path on the map."""
+        # Nothing to paint if the goal was never reached
+        path = self._path_indices()
+        if len(path) == 0:
+            return
+
+        # Paint the path (without start and goal) on the map, or only record it when headless
+        if self.headless:
+            if self.sparse:
+                self.explored.update(dict.fromkeys(path[1:-1].tolist(), PATH))
+            else:
+                np.frombuffer(self.explored, dtype=np.int8)[path[1:-1]] = PATH
+            return
+        self.map.str_map[np.divmod(path[1:-1], self.width)] = ' x '
+        self.map.str_map[self.stop[0], self.stop[1]] = ' G '
+
+    def _path_indices(self) -> np.ndarray:
+        """The flat indices of the cells on the path to the goal, as painted by _paint_path."""
+        return self.state.path(self.stop[0]*self.width + self.stop[1])
+
+    def draw(self):
+        """Draws the explored cells and the path recorded by a headless search on the map."""
+        if not self.headless:
+            return
+        str_map = self.map.str_map
+        if self.sparse:
+            for index, value in self.explored.items():
+                str_map[divmod(index, self.width)] = ' - ' if value == EXPLORED else ' x '
+        else:
+            overlay = np.frombuffer(self.explored, dtype=np.int8).reshape(self.map.int_map.shape)
+            str_map[overlay == EXPLORED] = ' - '
+            str_map[overlay == PATH] = ' x '
+        if self.state.reached(self.stop[0]*self.width + self.stop[1]):
+            str_map[self.stop[0], self.stop[1]] = ' G '
+
+    def _search_cells(self, heuristic: Callable, heuristic_weight: float, stats: SearchStats):
+        """The main A*-loop, generating the neighbors of every cell as it is expanded."""
+        get_neighbors = self.map.get_cell_neighbors if self.connectivity == 4 else self.map.get_cell_neighbors_8
+        get_neighbors = stats.timed(get_neighbors, 'neighbors')
+        frontier = stats.timed_frontier(self.frontier)
+        int_map, width = self.map.int_map, self.width
+        stamp, reached = self.state.stamp, self.state.generation
+        pushes = reopened = peak = 0
+        sample_every = stats.sample_every
+
         # Main algorithm loop:
-        while not self.frontier.empty():
+        while not frontier.empty():
             # Update goal for task 5
-            self.map.tick() 
+            self.map.tick()
             self.stop = self.map.get_goal_pos()
 
             # Get next node from the Frontier
-            current = self.frontier.get()[1]
+            if len(frontier) > peak:
+                peak = len(frontier)
+            index = frontier.pop()[1]
+            stamp[index] = reached + 1
+            current = list(divmod(index, width))
+            self.expanded += 1
+            if sample_every and self.expanded % sample_every == 0:
+                stats.sample(self.expanded, len(frontier))
 
             # Check if it is the goal
             if (current[0] == self.stop[0] and current[1] == self.stop[1]):
                 print("Goal found!")
                 break
 
-            # For all Neighbors of Current
-            for neighbor in self.map.get_cell_neighbors(current):
+            # For all Neighbors of Current, moving into a neighbor costs its value
+            edges = [(neighbor[0]*width + neighbor[1], int(int_map[neighbor[0], neighbor[1]]))
+                     for neighbor in get_neighbors(current)]
+            pushed, reopened_now = self._relax(self.state, frontier, index, edges, heuristic, self.stop,
+                                               heuristic_weight, draw=True)
+            pushes += pushed
+            reopened += reopened_now
+
+        stats.pushes, stats.reopened, stats.peak_frontier = pushes, reopened, peak
+
+    def _search_graph(self, heuristic: Callable, heuristic_weight: float, stats: SearchStats):
+        """
+        The same loop as _search_cells, but walking the neighbor table of the map using flat cell indices.
+        (Looking up the neighbors is part of the loop here, so it is not timed separately.)
+        """
+        offsets, targets, costs = (a.tolist() for a in self.map.get_neighbor_graph(self.connectivity))
+        frontier = stats.timed_frontier(self.frontier)
+        width = self.width
+        stamp, reached = self.state.stamp, self.state.generation
+        pushes = reopened = peak = 0
+        sample_every = stats.sample_every
+
+        while not frontier.empty():
+            # Update goal for task 5
+            self.map.tick()
+            self.stop = self.map.get_goal_pos()
+
+            # Get next node from the Frontier
+            if len(frontier) > peak:
+                peak = len(frontier)
+            current = frontier.pop()[1]
+            stamp[current] = reached + 1
+            self.expanded += 1
+            if sample_every and self.expanded % sample_every == 0:
+                stats.sample(self.expanded, len(frontier))
+
+            # Check if it is the goal
+            if current == self.stop[0]*width + self.stop[1]:
+                print("Goal found!")
+                break
+
+            # For all Neighbors of Current, as listed in the neighbor table
+            first, last = offsets[current], offsets[current + 1]
+            pushed, reopened_now = self._relax(self.state, frontier, current, zip(targets[first:last], costs[first:last]),
+                                               heuristic, self.stop, heuristic_weight, draw=True)
+            pushes += pushed
+            reopened += reopened_now
+
+        stats.pushes, stats.reopened, stats.peak_frontier = pushes, reopened, peak
+
+    def _relax(self, state: SearchState, frontier: IndexedHeap, current: int, edges: Iterable[tuple[int, int]],
+               heuristic: Callable = None, goal=None, heuristic_weight: float = 1.0,
+               draw: bool = False) -> tuple[int, int]:
+        """
+        Relaxes the edges out of an expanded cell, the step shared by the A* loops and the batch searches. Every
+        neighbor reached for the first time, or more cheaply than before, gets current as its parent and is pushed on
+        the frontier, reopening it if it was closed. \\
+        params:
+            - state, frontier:
+                - the search state and frontier of the search.
+            - current:
+                - the flat index of the expanded cell.
+            - edges:
+                - (neighbor, step cost) pairs, with the neighbors as flat indices.
+            - heuristic, goal, heuristic_weight:
+                - neighbors are pushed with their cost plus heuristic(neighbor cell, goal)*heuristic_weight, or with
+                  only their cost if heuristic is None.
+            - draw:
+                - if True, mark the neighbors as explored, in the overlay when headless and otherwise on the map.
+        returns:
+            - the number of pushes, and the number of closed cells that were reopened.
+        """
+        g, parent, stamp, reached = state.g, state.parent, state.stamp, state.generation
+        width = self.width
+        explored = self.explored if draw and self.headless else None
+        str_map = self.map.str_map if draw and not self.headless else None
+        base = g[current]
+        pushes = reopened = 0
+        for neighbor, step in edges:
+            new_cost = base + step
+            if stamp[neighbor] < reached or new_cost < g[neighbor]:
+                if explored is not None:
+                    explored[neighbor] = EXPLORED
+                elif str_map is not None:
+                    str_map[divmod(neighbor, width)] = ' - '
+                if stamp[neighbor] == reached + 1:
+                    reopened += 1
+                g[neighbor] = new_cost
+                parent[neighbor] = current
+                stamp[neighbor] = reached
+                if heuristic is None:
+                    frontier.push(neighbor, new_cost)
+                else:
+                    frontier.push(neighbor, new_cost + heuristic(divmod(neighbor, width), goal)*heuristic_weight)
+                pushes += 1
+        return pushes, reopened
+
+    def _batch_search(self, source: int) -> tuple[SearchState, IndexedHeap]:
+        """
+        Starts a new search of find_paths or find_nearest from a cell. Their state and frontier are allocated on the
+        first search only, and reset in O(1) for every search after that. \\
+        returns:
+            - the search state (with only the source reached) and the frontier (with only the source in it).
+        """
+        if self._batch_state is None:
+            self._batch_state = SearchState(self.map.int_map.size)
+            self._batch_frontier = IndexedHeap(self.map.int_map.size)
+        state, frontier = self._batch_state, self._batch_frontier
+        state.reset()
+        state.open(source, 0)
+        frontier.clear()
+        frontier.push(source, 0)
+        return state, frontier
+
+    def _search_bidirectional(self, to_goal: Callable, to_start: Callable, stats: SearchStats):
+        """
+        Bidirectional A*, walking the neighbor table of the map forwards from the start and backwards from the goal. \\
+        Both searches use the average of the two heuristics as potential, p(v) = (h(v -> goal) - h(start -> v)) / 2,
+        so they order their frontiers consistently. The side with the smaller frontier is expanded next, and the
+        search stops once the sum of both frontier minimums reaches the cheapest path through a cell reached from
+        both sides. That path is then written into the (forward) search state.
+        """
+        if self.map.get_goal_pos() != self.map.get_end_goal_pos():
+            raise ValueError('bidirectional search needs a goal that does not move')
+        offsets, targets, costs = (a.tolist() for a in self.map.get_neighbor_graph(self.connectivity))
+        values = self.map.int_map.ravel().tolist()
+        width = self.width
+        headless, explored = self.headless, self.explored
+        source, target = self.start[0]*width + self.start[1], self.stop[0]*width + self.stop[1]
+        start_cell, goal_cell = divmod(source, width), divmod(target, width)
+
+        def potential(index: int) -> float:
+            cell = divmod(index, width)
+            # Moving costs the value of the cell moved into, so start -> v costs v -> start + value(v) - value(start)
+            from_start = to_start(cell, start_cell) + values[index] - values[source]
+            return (to_goal(cell, goal_cell) - from_start) / 2
+
+        # Forward: the state and frontier of the search, backward: new ones rooted at the goal
+        backward_state = SearchState(self.map.int_map.size)
+        backward_state.open(target, 0)
+        backward_frontier = stats.timed_frontier(IndexedHeap(self.map.int_map.size))
+        backward_frontier.push(target, -potential(target))
+        forward_frontier = stats.timed_frontier(self.frontier)
+        forward_frontier.push(source, potential(source))
+        pushes, reopened, peak = 2, 0, 0
+        sample_every = stats.sample_every
+
+        best, meeting = (0, source) if source == target else (math.inf, -1)
+        while not forward_frontier.empty() and not backward_frontier.empty():
+            if forward_frontier.peek()[0] + backward_frontier.peek()[0] >= best:
+                break
+
+            forward = len(forward_frontier) <= len(backward_frontier)
+            if forward:
+                state, other, frontier, sign = self.state, backward_state, forward_frontier, 1
+            else:
+                state, other, frontier, sign = backward_state, self.state, backward_frontier, -1
+            g, parent, stamp, reached = state.g, state.parent, state.stamp, state.generation
+
+            peak = max(peak, len(forward_frontier) + len(backward_frontier))
+            current = frontier.pop()[1]
+            stamp[current] = reached + 1
+            self.expanded += 1
+            if sample_every and self.expanded % sample_every == 0:
+                stats.sample(self.expanded, len(forward_frontier) + len(backward_frontier))
+
+            for edge in range(offsets[current], offsets[current + 1]):
+                neighbor = targets[edge]
+                # Backwards, the step neighbor -> current costs the value of current
+                new_cost = g[current] + (costs[edge] if forward else values[current])
+
+                if stamp[neighbor] < reached or new_cost < g[neighbor]:
+                    if headless:
+                        explored[neighbor] = EXPLORED
+                    else:
+                        self.map.str_map[divmod(neighbor, width)] = ' - '
+
+                    if stamp[neighbor] == reached + 1:
+                        reopened += 1
+                    g[neighbor] = new_cost
+                    parent[neighbor] = current
+                    stamp[neighbor] = reached
+                    frontier.push(neighbor, new_cost + sign*potential(neighbor))
+                    pushes += 1
+
+                    # A path through this cell, if the other side reached it too
+                    if other.reached(neighbor) and new_cost + other.g[neighbor] < best:
+                        best, meeting = new_cost + other.g[neighbor], neighbor
+
+        stats.pushes, stats.reopened, stats.peak_frontier = pushes, reopened, peak
+        if meeting == -1:
+            return
+        print("Goal found!")
+
+        # Continue the forward parents along the backward half of the path
+        current = meeting
+        while current != target:
+            next_cell = backward_state.parent[current]
+            self.state.open(next_cell, self.state.g[current] + values[next_cell], current)
+            current = next_cell
+
+    def find_shortest_path_anytime(self, heuristic: Union[str, Callable], deadline: float,
+                                   initial_weight: float = 3.0, weight_step: float = 0.5,
+                                   use_heuristic_grid: bool = False,
+                                   stats: SearchStats = None) -> tuple[list[tuple[float, int, float, float]], SearchStats]:
+        """
+        Finds a path quickly with a high heuristic weight, and improves it until the deadline (ARA*). \\
+        Every stage lowers the weight and continues from the previous search, only re-expanding cells whose cost
+        went down, until the weight reaches 1 (an optimal path) or time runs out. The best path found is drawn
+        on the map. Only for tasks where the goal does not move. \\
+        params:
+            - heuristic:
+                - the heuristic function to use, or the name of a built-in heuristic, see get_heuristic.
+                  The bounds only hold for a consistent heuristic.
+            - deadline:
+                - the time budget in seconds. The first stage always runs to the end, so there is a path to return.
+            - initial_weight:
+                - the heuristic weight of the first stage.
+            - weight_step:
+                - how much to lower the weight after every stage.
+            - use_heuristic_grid:
+                - if True, compute the heuristic for all cells at once, see get_heuristic.
+            - stats:
+                - the SearchStats to fill in (summed over all stages), see find_shortest_path.
+        returns:
+            - one (weight, cost, bound, seconds) tuple per stage: the path found has the given cost, which is at most
+              bound times the optimal cost, after the given time. A stage cut short by the deadline is included.
+            - the SearchStats of the search.
+        """
+        if self.map.get_goal_pos() != self.map.get_end_goal_pos():
+            raise ValueError('anytime search needs a goal that does not move')
+        t0 = time.perf_counter()
+        stats = stats or SearchStats()
+        stats.begin('anytime')
+        heuristic = stats.timed(get_heuristic(heuristic, self.map, use_heuristic_grid), 'heuristic')
+        frontier = stats.timed_frontier(self.frontier)
+        pushes = reopened = peak = 0
+        sample_every = stats.sample_every
+        offsets, targets, costs = (a.tolist() for a in self.map.get_neighbor_graph(self.connectivity))
+        width = self.width
+        headless, explored = self.headless, self.explored
+        state = self.state
+        g, parent, stamp, reached = state.g, state.parent, state.stamp, state.generation
+        goal = self.stop[0]*width + self.stop[1]
+
+        h = {}
 
-                # Calculate the cost of Neighbor from Current
-                new_cost = self.cost[current[0], current[1]] + self.map.int_map[neighbor[0], neighbor[1]]
+        def estimate(index: int) -> float:
+            if index not in h:
+                h[index] = heuristic(divmod(index, width), self.stop)
+            return h[index]
 
-                # If Neighbor has not been visited, or if Current has a lower cost for the Neighbor 
-                if (self.cost[neighbor[0], neighbor[1]] == -1) or new_cost < self.cost[neighbor[0], neighbor[1]]:
-                    self.map.str_map[neighbor[0], neighbor[1]] = ' - '
+        stages = []
+        weight = max(initial_weight, 1.0)
+        # Cells whose cost went down after they were expanded in the current stage
+        inconsistent = set()
+        frontier.push(self.start[0]*width + self.start[1], estimate(self.start[0]*width + self.start[1])*weight)
+        while True:
+            # Expand until no cell in the frontier can improve the path to the goal (with this weight)
+            timed_out = False
+            while not frontier.empty() and (stamp[goal] < reached or g[goal] > frontier.peek()[0]):
+                if stages and time.perf_counter() - t0 > deadline:
+                    timed_out = True
+                    break
+                if len(frontier) > peak:
+                    peak = len(frontier)
+                current = frontier.pop()[1]
+                stamp[current] = reached + 1
+                self.expanded += 1
+                if sample_every and self.expanded % sample_every == 0:
+                    stats.sample(self.expanded, len(frontier))
 
-                    # Update parent and cost of Neighbor
-                    self.parent[neighbor[0], neighbor[1]] = [current[0], current[1]]
-                    self.cost[neighbor[0], neighbor[1]] = new_cost
+                for edge in range(offsets[current], offsets[current + 1]):
+                    neighbor = targets[edge]
+                    new_cost = g[current] + costs[edge]
+                    if stamp[neighbor] < reached or new_cost < g[neighbor]:
+                        if headless:
+                            explored[neighbor] = EXPLORED
+                        else:
+                            self.map.str_map[divmod(neighbor, width)] = ' - '
+                        was_closed = stamp[neighbor] == reached + 1
+                        g[neighbor] = new_cost
+                        parent[neighbor] = current
+                        if was_closed:
+                            # Not expanded again in this stage, but in the next one
+                            inconsistent.add(neighbor)
+                            reopened += 1
+                        else:
+                            stamp[neighbor] = reached
+                            frontier.push(neighbor, new_cost + estimate(neighbor)*weight)
+                            pushes += 1
+
+            if stamp[goal] < reached:
+                # The goal can not be reached
+                break
+
+            # Suboptimality bound: the cost found compared to the lowest unweighted f-value left to expand
+            lowest = min((g[i] + estimate(i) for i in self.frontier.items + list(inconsistent)), default=math.inf)
+            bound = min(weight, g[goal] / lowest) if lowest > 0 else weight
+            stages.append((weight, g[goal], max(bound, 1.0), time.perf_counter() - t0))
+            if timed_out or weight == 1.0 or bound <= 1.0:
+                break
+
+            # Next stage: lower the weight, re-key the frontier and add the inconsistent cells
+            weight = max(weight - weight_step, 1.0)
+            for index in self.frontier.items + list(inconsistent):
+                stamp[index] = reached
+                frontier.push(index, g[index] + estimate(index)*weight)
+                pushes += 1
+            inconsistent.clear()
+            state.reopen_all()
+
+        stats.pushes, stats.reopened, stats.peak_frontier = pushes, reopened, peak
+        stats.end(self.expanded, state.cost(goal))
+        if stats.found:
+            print("Goal found!")
+            self._paint_path()
+        return stages, stats
+
+    def find_paths(self, queries: list, heuristic: Union[str, Callable] = None,
+                   heuristic_weight: float = 1.0) -> tuple[list[np.ndarray], float]:
+        """
+        Finds the shortest paths of many (start, goal) queries on the same map. \\
+        Queries are grouped by start, and every group is answered by a single Dijkstra search that runs until all
+        of its goals are reached. The search state is kept between calls, and reset in O(1) for every search. \\
+        Does not tick or draw on the map. \\
+        params:
+            - queries:
+                - a list of (start, goal) cell pairs, e.g. [([27, 18], [40, 32]), ...].
+            - heuristic:
+                - optional heuristic function, e.g. heuristic(cellA, cellB), or name (see get_heuristic).
+                  Used (as A*) for starts with a single goal.
+            - heuristic_weight:
+                - a float value specifying how much to weight the heuristic (compared to the cell cost)
+        returns:
+            - a list with one path per query (in the same order), as an int32 array of shape (n, 2) going from start
+              to goal. Unreachable goals give an empty (0, 2) array.
+            - the throughput, in queries per second.
+        """
+        t0 = time.perf_counter()
+        offsets, targets, costs = (a.tolist() for a in self.map.get_neighbor_graph(self.connectivity))
+        width = self.width
+        if heuristic is not None:
+            heuristic = get_heuristic(heuristic, self.map)
+
+        # Group the queries by their start cell
+        groups = {}
+        for i, (start, goal) in enumerate(queries):
+            groups.setdefault(start[0]*width + start[1], []).append((i, goal[0]*width + goal[1]))
+
+        paths = [None] * len(queries)
+        for source, group in groups.items():
+            remaining = {goal for _, goal in group}
+            # With a single goal the search can be guided towards it
+            target = divmod(group[0][1], width) if heuristic is not None and len(remaining) == 1 else None
+            guide = heuristic if target is not None else None
+            state, frontier = self._batch_search(source)
+
+            # One-to-many Dijkstra, stopping when all goals of the group are reached
+            while not frontier.empty():
+                current = frontier.pop()[1]
+                remaining.discard(current)
+                if not remaining:
+                    break
+                first, last = offsets[current], offsets[current + 1]
+                self._relax(state, frontier, current, zip(targets[first:last], costs[first:last]),
+                            guide, target, heuristic_weight)
+
+            for i, goal in group:
+                paths[i] = self._batch_path(goal)
+
+        throughput = len(queries) / max(time.perf_counter() - t0, 1e-9)
+        return paths, throughput
+
+    def find_nearest(self, goals: list, heuristic: Union[str, Callable] = None,
+                     start: list[int] = None) -> tuple[int, np.ndarray]:
+        """
+        Finds the cheapest path to whichever of several goals is cheapest to reach, with a single search that stops
+        at the first goal it expands. Uses the same state as find_paths, and does not tick or draw on the map. \\
+        For the paths to all goals use find_paths, and for the cost from (or to) every cell use fields.cost_field. \\
+        params:
+            - goals:
+                - a list of cells, e.g. [[40, 32], [5, 10]].
+            - heuristic:
+                - optional heuristic function or name (see get_heuristic). The search is guided by the smallest
+                  estimate to any of the goals, so the nearest goal is still found with an admissible heuristic.
+            - start:
+                - the cell to search from, by default the start of the map.
+        returns:
+            - the index (in goals) of the nearest goal, or -1 if no goal can be reached.
+            - the path to it, as an int32 array of shape (n, 2) going from start to goal (empty if none).
+        """
+        offsets, targets, costs = (a.tolist() for a in self.map.get_neighbor_graph(self.connectivity))
+        width = self.width
+        start = self.map.get_start_pos() if start is None else start
+        goal_index = {}
+        for i, goal in enumerate(goals):
+            goal_index.setdefault(goal[0]*width + goal[1], i)
+        if heuristic is not None:
+            heuristic = get_heuristic(heuristic, self.map)
+            cells = [tuple(goal) for goal in goals]
+
+            def nearest(cell: tuple[int, int], _) -> float:
+                return min(heuristic(cell, goal) for goal in cells)
+        else:
+            nearest = None
+
+        state, frontier = self._batch_search(start[0]*width + start[1])
+        found = -1
+        while not frontier.empty():
+            current = frontier.pop()[1]
+            if current in goal_index:
+                found = current
+                break
+            first, last = offsets[current], offsets[current + 1]
+            self._relax(state, frontier, current, zip(targets[first:last], costs[first:last]), nearest)
 
-                    # Calculate priority based on new cost and heuristic
-                    prio = new_cost + heuristic(neighbor, self.stop)*heuristic_weight
+        if found == -1:
+            return -1, np.empty((0, 2), dtype=np.int32)
+        return goal_index[found], self._batch_path(found)
 
-                    # Put Neighbor in the Frontier with the given priority
-                    self.frontier.put((prio, neighbor))
+    def _batch_path(self, goal: int) -> np.ndarray:
+        """Follows the batch parents from goal back to the start, and returns the path as an (n, 2) int32 array."""
+        return self._cells(self._batch_state.path(goal))
 
-        # When goal is found
-        path = []
-        current = self.parent[int(self.stop[0]), int(self.stop[1])] # get parent of goal
-        # Until we reach the start, add current to path and set current to parent
-        while not (current[0] == self.start[0] and current[1] == self.start[1]):
-            path.append( current )
-            current = self.parent[int(current[0]), int(current[1])] # get parent of current
-        
-        # Paint the path of the map
-        for current in path:
-            self.map.str_map[int(current[0]), int(current[1])] = ' x '
-        self.map.str_map[int(self.stop[0]), int(self.stop[1])] = ' G '
+    def _cells(self, flat: np.ndarray) -> np.ndarray:
+        """Turns flat cell indices into an (n, 2) int32 array of cells."""
+        return np.column_stack(np.divmod(flat, self.width)).astype(np.int32).reshape(-1, 2)
 
     def show_path(self):
         """Shows the current state of the map as an image."""
+        self.draw()
         self.map.show_map()
 
     def get_image(self) -> Image.Image:
         """Returns the image-object of the map."""
-        return self.map.get_map_image()
\ No newline at end of file
+        self.draw()
+        return self.map.get_map_image()
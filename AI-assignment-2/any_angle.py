@@ -0,0 +1,237 @@
+from Map import Map_Obj
+from a_star import AStar, EXPLORED, get_heuristic
+from search_state import SearchState
+from search_stats import SearchStats
+from typing import Callable, Union
+from math import hypot, inf
+import numpy as np
+
+
+def _traverse(a, b):
+    """
+    Walks the straight line between the centers of cells a and b. \\
+    returns:
+        - a generator of ((row, col), fraction) for every cell the line passes through, from a to b, with the fraction
+          of the line inside it. A line through the corner of four cells only passes the two on the line.
+    """
+    r, c = int(a[0]), int(a[1])
+    dr, dc = int(b[0]) - r, int(b[1]) - c
+    step_r, step_c = (dr > 0) - (dr < 0), (dc > 0) - (dc < 0)
+    nr, nc = abs(dr), abs(dc)
+    # The line crosses row border i at t = (2i - 1) / 2nr and column border j at t = (2j - 1) / 2nc
+    i = j = 1
+    t = 0.0
+    while i <= nr or j <= nc:
+        row_key, col_key = (2*i - 1)*nc, (2*j - 1)*nr
+        if j > nc or (i <= nr and row_key < col_key):
+            t_next = (2*i - 1) / (2*nr)
+            yield (r, c), t_next - t
+            r, i = r + step_r, i + 1
+        elif i > nr or col_key < row_key:
+            t_next = (2*j - 1) / (2*nc)
+            yield (r, c), t_next - t
+            c, j = c + step_c, j + 1
+        else:
+            t_next = (2*i - 1) / (2*nr)
+            yield (r, c), t_next - t
+            r, c, i, j = r + step_r, c + step_c, i + 1, j + 1
+        t = t_next
+    yield (r, c), 1.0 - t
+
+
+def line_cells(a, b) -> list[tuple[int, int]]:
+    """Returns the cells the straight line between the centers of cells a and b passes through, from a to b."""
+    return [cell for cell, _ in _traverse(a, b)]
+
+
+def line_cost(grid, a, b) -> float:
+    """
+    Computes the cost of moving in a straight line from the center of cell a to the center of cell b: the length of
+    the line inside every cell times the value of the cell, plus half the value of b minus half the value of a. \\
+    That makes a straight step to a neighbor cost the value of the neighbor, like on the grid, and the costs of the
+    segments of a path add up to the length weighted cost of the whole line plus a constant, so paths can be
+    compared. \\
+    params:
+        - grid:
+            - the values of the map, e.g. map.int_map, or map.int_map.tolist() which is faster to index.
+        - a, b:
+            - the cells to move between.
+    returns:
+        - the cost, or inf if the line passes through a wall (there is no line of sight).
+    """
+    cost = 0.0
+    for (r, c), fraction in _traverse(a, b):
+        value = grid[r][c]
+        if value == -1:
+            return inf
+        cost += value*fraction
+    return cost*hypot(b[0] - a[0], b[1] - a[1]) + (grid[b[0]][b[1]] - grid[a[0]][a[1]]) / 2
+
+
+def path_cost(grid, path) -> float:
+    """Returns the cost of a path of cells joined by straight lines (see line_cost), inf if a line hits a wall."""
+    cells = np.asarray(path).tolist()
+    return sum(line_cost(grid, a, b) for a, b in zip(cells[:-1], cells[1:]))
+
+
+def smooth_path(map: Map_Obj, path: np.ndarray) -> np.ndarray:
+    """
+    Shortens a path by pulling it straight (string pulling): a cell of the path is only kept as a waypoint if the
+    straight line past it would hit a wall, or would cost more than going through it. \\
+    The smoothed path never costs more than the path itself, with the costs of path_cost. \\
+    params:
+        - map:
+            - the Map_Obj of the path.
+        - path:
+            - the path as an array of cells going from start to goal, e.g. AStar.path or a path of find_paths.
+    returns:
+        - the waypoints of the smoothed path, as an int32 array of shape (n, 2) including the start and goal.
+          Consecutive waypoints are joined by straight lines, see line_cells.
+    """
+    path = np.asarray(path, dtype=np.int32).reshape(-1, 2)
+    if len(path) <= 2:
+        return path.copy()
+    grid = map.int_map.tolist()
+    cells = path.tolist()
+
+    waypoints = [cells[0]]
+    anchor = cells[0]
+    for previous, cell in zip(cells[1:-1], cells[2:]):
+        # Keep the line from the last waypoint going to cell, or turn at the previous cell
+        through = line_cost(grid, anchor, previous) + line_cost(grid, previous, cell)
+        if line_cost(grid, anchor, cell) > through:
+            waypoints.append(previous)
+            anchor = previous
+    waypoints.append(cells[-1])
+    return np.array(waypoints, dtype=np.int32)
+
+
+class ThetaStar(AStar):
+    def __init__(self, map: Map_Obj, connectivity: int = 8, headless: bool = False) -> None:
+        """
+        Initializes an any-angle search (Theta*), using a Map_Obj. \\
+        Like A*, but a cell can take the parent of the cell it is reached from as its own parent, moving to it in a
+        straight line, if that line is not blocked and not more expensive (see line_cost). The path is then made of
+        the few cells where it turns, joined by straight lines, instead of grid steps. Costs are those of line_cost,
+        so they are floats and diagonal steps cost about sqrt(2) times the value of the cells. \\
+        params:
+            - map:
+                - the Map_Obj to find the path of, given a start and a goal.
+            - connectivity:
+                - 4 or 8, the neighbors to expand every cell to (the lines between waypoints can go in any direction).
+            - headless:
+                - if True, only record the explored cells and path, see AStar.
+        """
+        super().__init__(map, connectivity, headless)
+        # A tiled map reads its cells on demand, also as grid[row][col]
+        self.grid = map.int_map if self.sparse else map.int_map.tolist()
+
+        # Costs of lines are not whole numbers. They are summed in float64 like line_cost, so long paths do not drift
+        self.state = SearchState(map.int_map.size, cost_type='d', sparse=self.sparse)
+        self.state.open(self.start[0]*self.width + self.start[1], 0)
+
+    def find_shortest_path(self, heuristic: Union[str, Callable] = 'euclidean_cost', heuristic_weight: float = 1.0,
+                           stats: SearchStats = None) -> SearchStats:
+        """
+        Finds an any-angle path of the map, and draws the cells its lines pass through on the map. \\
+        The waypoints of the path are in `path`. \\
+        params:
+            - heuristic:
+                - the heuristic function to use. Must take in two cells, e.g. heuristic(cellA, cellB).
+                  Can also be the name of a built-in heuristic, see get_heuristic. By default the straight-line
+                  distance times the cost of the cheapest cell.
+            - heuristic_weight:
+                - a float value specifying how much to weight the heuristic (compared to the cell cost)
+            - stats:
+                - the SearchStats to fill in, see AStar.find_shortest_path. Line of sight checks count as
+                  neighbor generation.
+        returns:
+            - the SearchStats of the search.
+        """
+        stats = stats or SearchStats()
+        stats.begin('theta')
+        heuristic = stats.timed(get_heuristic(heuristic, self.map), 'heuristic')
+        get_neighbors = self.map.get_cell_neighbors if self.connectivity == 4 else self.map.get_cell_neighbors_8
+        get_neighbors = stats.timed(get_neighbors, 'neighbors')
+        cost_of = stats.timed(line_cost, 'neighbors')
+        frontier = stats.timed_frontier(self.frontier)
+        grid, width = self.grid, self.width
+        g, parent, stamp = self.state.g, self.state.parent, self.state.stamp
+        reached = self.state.generation
+        pushes = peak = 0
+        sample_every = stats.sample_every
+
+        while not frontier.empty():
+            # Update goal for task 5
+            self.map.tick()
+            self.stop = self.map.get_goal_pos()
+
+            if len(frontier) > peak:
+                peak = len(frontier)
+            index = frontier.pop()[1]
+            stamp[index] = reached + 1
+            current = divmod(index, width)
+            self.expanded += 1
+            if sample_every and self.expanded % sample_every == 0:
+                stats.sample(self.expanded, len(frontier))
+
+            if current[0] == self.stop[0] and current[1] == self.stop[1]:
+                print("Goal found!")
+                break
+
+            grandparent = parent[index]
+            grandparent_cell = divmod(grandparent, width) if grandparent != -1 else None
+            for neighbor in get_neighbors(current):
+                neighbor_index = neighbor[0]*width + neighbor[1]
+                # Cells are expanded once, Theta* does not reopen them
+                if stamp[neighbor_index] == reached + 1:
+                    continue
+
+                # Step from the current cell, or go straight from its parent if that is cheaper
+                new_cost, new_parent = g[index] + cost_of(grid, current, neighbor), index
+                if grandparent_cell is not None:
+                    straight = g[grandparent] + cost_of(grid, grandparent_cell, neighbor)
+                    if straight <= new_cost:
+                        new_cost, new_parent = straight, grandparent
+
+                if stamp[neighbor_index] < reached or new_cost < g[neighbor_index]:
+                    if self.headless:
+                        self.explored[neighbor_index] = EXPLORED
+                    else:
+                        self.map.str_map[neighbor[0], neighbor[1]] = ' - '
+                    g[neighbor_index] = new_cost
+                    parent[neighbor_index] = new_parent
+                    stamp[neighbor_index] = reached
+                    frontier.push(neighbor_index, new_cost + heuristic(neighbor, self.stop)*heuristic_weight)
+                    pushes += 1
+
+        stats.pushes, stats.peak_frontier = pushes, peak
+        stats.end(self.expanded, self.state.cost(self.stop[0]*self.width + self.stop[1]))
+        self._paint_path()
+        return stats
+
+    def _path_indices(self) -> np.ndarray:
+        """The flat indices of the cells the lines between the waypoints pass through."""
+        waypoints = self.path.tolist()
+        cells = [cell for a, b in zip(waypoints[:-1], waypoints[1:]) for cell in line_cells(a, b)[:-1]]
+        cells += waypoints[-1:]
+        return np.array([r*self.width + c for r, c in cells], dtype=np.int32)
+
+
+if __name__ == "__main__":
+    import contextlib
+    import io
+
+    # Grid paths compared to the same paths pulled straight and to any-angle paths, on every task
+    for task in range(1, 5):
+        map = Map_Obj(task=task)
+        grid = map.int_map.tolist()
+        astar = AStar(map, 8, headless=True)
+        theta = ThetaStar(Map_Obj(task=task), headless=True)
+        with contextlib.redirect_stdout(io.StringIO()):
+            astar.find_shortest_path('chebyshev')
+            theta.find_shortest_path()
+        smoothed = smooth_path(map, astar.path)
+        print(f"Task {task}: A* {len(astar.path)} cells (cost {path_cost(grid, astar.path):.1f}), "
+              f"smoothed {len(smoothed)} waypoints (cost {path_cost(grid, smoothed):.1f}), "
+              f"Theta* {len(theta.path)} waypoints (cost {path_cost(grid, theta.path):.1f})")
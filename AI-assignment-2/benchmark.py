@@ -0,0 +1,197 @@
+from Map import Map_Obj
+from a_star import AStar
+from jps import JumpPointSearch
+from collections import deque
+import contextlib
+import io
+import json
+import math
+import platform
+import time
+import tracemalloc
+import numpy as np
+
+# Search engines to benchmark: name -> (class, keyword arguments of find_shortest_path)
+ENGINES = {
+    'astar': (AStar, {}),
+    'astar_graph': (AStar, {'use_graph': True}),
+    'jps': (JumpPointSearch, {}),
+}
+
+
+def scaled_map(scale: int, task: int = 4) -> tuple[np.ndarray, list[int], list[int]]:
+    """
+    Builds a synthetic map with about `scale` times the cells of the map of a task (by default the Edgar map), by
+    mirroring its inside (without the outer wall) over and over, so the copies connect wherever the original has
+    open cells at its edges. \\
+    returns:
+        - the map, and the cells closest to the top-left and bottom-right corners (as start and goal) of the largest
+          region of connected open cells.
+    """
+    inside = Map_Obj(task=task).int_map[1:-1, 1:-1]
+    side = math.sqrt(scale)
+    height, width = round(inside.shape[0]*side), round(inside.shape[1]*side)
+    grid = np.pad(inside, ((0, height - inside.shape[0]), (0, width - inside.shape[1])), mode='symmetric')
+    grid = np.pad(grid, 1, constant_values=-1)
+
+    region = np.argwhere(_largest_region(grid))
+    corner_distance = region.sum(axis=1)
+    return grid, region[corner_distance.argmin()].tolist(), region[corner_distance.argmax()].tolist()
+
+
+def _largest_region(grid: np.ndarray) -> np.ndarray:
+    """Returns a mask of the largest set of open cells connected by straight moves (so also by diagonal ones)."""
+    offsets, targets, _ = (a.tolist() for a in Map_Obj.from_array(grid, [0, 0], [0, 0]).get_neighbor_graph(4))
+    label = [0] * grid.size
+    sizes = [0]
+    for seed in np.flatnonzero(grid.ravel() != -1).tolist():
+        if label[seed]:
+            continue
+        sizes.append(1)
+        label[seed] = len(sizes) - 1
+        queue = deque([seed])
+        while queue:
+            current = queue.popleft()
+            for edge in range(offsets[current], offsets[current + 1]):
+                neighbor = targets[edge]
+                if not label[neighbor]:
+                    label[neighbor] = label[seed]
+                    sizes[-1] += 1
+                    queue.append(neighbor)
+    return (np.array(label) == int(np.argmax(sizes))).reshape(grid.shape)
+
+
+def benchmark_cases(scales: list[int]) -> list[tuple[str, np.ndarray, list[int], list[int], list[int]]]:
+    """Returns (name, map, start, goal, end goal) of every task, and of a synthetic map per scale."""
+    cases = []
+    for task in range(1, 6):
+        map = Map_Obj(task=task)
+        cases.append((f"task{task}", map.int_map, map.get_start_pos(), map.get_goal_pos(), map.get_end_goal_pos()))
+    for scale in scales:
+        grid, start, goal = scaled_map(scale)
+        cases.append((f"edgar_x{scale}", grid, start, goal, goal))
+    return cases
+
+
+def run_case(engine: str, grid: np.ndarray, start: list[int], goal: list[int], end_goal: list[int],
+             connectivity: int, weight: float, repeat: int = 3, memory: bool = True) -> dict:
+    """
+    Runs one search a number of times on a fresh copy of the map. \\
+    The heuristic is 'euclidean_cost', the straight-line distance times the cost of the cheapest cell. It never
+    overestimates with either connectivity, whatever the cheapest cell costs, so with weight 1 the costs are optimal
+    and must not change between runs. \\
+    returns:
+        - the best wall time (of the search only), the expanded cells and cost, and (if memory is True) the peak
+          memory allocated by setting up and running the search (measured in an extra run).
+    """
+    search_class, options = ENGINES[engine]
+
+    def setup():
+        return search_class(Map_Obj.from_array(grid.copy(), start, goal, end_goal), connectivity, headless=True)
+
+    best = math.inf
+    for _ in range(repeat):
+        search = setup()
+        with contextlib.redirect_stdout(io.StringIO()):
+            stats = search.find_shortest_path('euclidean_cost', weight, **options)
+        best = min(best, stats.time_total)
+
+    peak = None
+    if memory:
+        tracemalloc.start()
+        search = setup()
+        with contextlib.redirect_stdout(io.StringIO()):
+            search.find_shortest_path('euclidean_cost', weight, **options)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return {'seconds': best, 'expanded': stats.expanded, 'cost': stats.cost, 'peak_bytes': peak}
+
+
+def run_benchmark(scales: list[int] = (10, 100, 1000), engines: list[str] = tuple(ENGINES),
+                  connectivities: list[int] = (4, 8), weights: list[float] = (1.0, 1.5, 2.0),
+                  repeat: int = 3, memory: bool = True) -> dict:
+    """
+    Runs every engine on every task and synthetic map, for every connectivity and heuristic weight. \\
+    returns:
+        - {'environment': {...}, 'results': [{'map', 'cells', 'engine', 'connectivity', 'weight', 'seconds',
+          'expanded', 'cost', 'peak_bytes'}, ...]}, ready to be written as JSON.
+    """
+    results = []
+    for name, grid, start, goal, end_goal in benchmark_cases(scales):
+        for engine in engines:
+            for connectivity in connectivities:
+                for weight in weights:
+                    result = {'map': name, 'cells': int(grid.size), 'engine': engine,
+                              'connectivity': connectivity, 'weight': weight}
+                    result.update(run_case(engine, grid, start, goal, end_goal, connectivity, weight, repeat, memory))
+                    results.append(result)
+                    print(f"{name:>12} {engine:>11} {connectivity} {weight:>4} | {result['seconds']*1000:>9.1f} ms "
+                          f"{result['expanded']:>9} expanded, cost {result['cost']}")
+    environment = {'python': platform.python_version(), 'numpy': np.__version__, 'machine': platform.machine(),
+                   'date': time.strftime('%Y-%m-%d %H:%M:%S')}
+    return {'environment': environment, 'results': results}
+
+
+def compare(results: dict, baseline: dict, tolerance: float = 0.25, slack: float = 0.005) -> list[str]:
+    """
+    Compares benchmark results to a baseline run. \\
+    params:
+        - tolerance:
+            - how much slower (or larger in memory) a case may get before it counts as a regression, e.g. 0.25 for 25%.
+        - slack:
+            - seconds a case may always get slower, so timer noise on the small tasks is not reported.
+    returns:
+        - a list of regressions: cases that got slower or use more memory, expand more cells or find another cost.
+          Cases missing from either run are skipped.
+    """
+    def key(result):
+        return result['map'], result['engine'], result['connectivity'], result['weight']
+
+    old = {key(result): result for result in baseline['results']}
+    regressions = []
+    for result in results['results']:
+        before = old.get(key(result))
+        if before is None:
+            continue
+        case = '{} {} conn={} w={}'.format(*key(result))
+        if result['cost'] != before['cost']:
+            regressions.append(f"{case}: cost {before['cost']} -> {result['cost']}")
+        if result['expanded'] > before['expanded']:
+            regressions.append(f"{case}: expanded {before['expanded']} -> {result['expanded']}")
+        if result['seconds'] > before['seconds']*(1 + tolerance) + slack:
+            regressions.append(f"{case}: {before['seconds']*1000:.1f} -> {result['seconds']*1000:.1f} ms")
+        if result['peak_bytes'] and before['peak_bytes'] and result['peak_bytes'] > before['peak_bytes']*(1 + tolerance):
+            regressions.append(f"{case}: peak memory {before['peak_bytes']} -> {result['peak_bytes']} bytes")
+    return regressions
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description='Benchmark the searches on the Samfundet tasks and larger synthetic maps.')
+    parser.add_argument('--scales', type=int, nargs='*', default=[10, 100, 1000],
+                        help='sizes of the synthetic maps, in multiples of the Edgar map (default: 10 100 1000)')
+    parser.add_argument('--engines', nargs='*', default=list(ENGINES), choices=list(ENGINES))
+    parser.add_argument('--connectivity', type=int, nargs='*', default=[4, 8], choices=[4, 8])
+    parser.add_argument('--weights', type=float, nargs='*', default=[1.0, 1.5, 2.0])
+    parser.add_argument('--repeat', type=int, default=3, help='runs per case, the fastest is kept')
+    parser.add_argument('--no-memory', action='store_true', help='skip the (slower) memory measurement')
+    parser.add_argument('--output', default='benchmark.json', help='file to write the results to')
+    parser.add_argument('--baseline', help='results of an earlier run to compare with, e.g. benchmark_baseline.json')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown before a regression')
+    args = parser.parse_args()
+
+    results = run_benchmark(args.scales, args.engines, args.connectivity, args.weights, args.repeat, not args.no_memory)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Wrote {len(results['results'])} results to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print('REGRESSION', regression)
+        print(f"{len(regressions)} regression(s) compared to {args.baseline}")
+        sys.exit(1 if regressions else 0)
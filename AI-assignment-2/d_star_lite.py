@@ -0,0 +1,170 @@
+from Map import Map_Obj
+from frontier import IndexedHeap
+from a_star import get_heuristic
+from typing import Callable, Union
+from math import inf
+
+
+class DStarLite:
+    def __init__(self, map: Map_Obj, heuristic: Union[str, Callable], connectivity: int = 4) -> None:
+        """
+        Initializes an incremental planner (D* Lite), using a Map_Obj. \\
+        The search tree is rooted at the (fixed) start, and is repaired instead of rebuilt when the goal moves
+        (task 5) or when the cost of a cell changes through set_cell_value/replace_map_values, so only the part
+        of the search affected by the change is redone. \\
+        params:
+            - map:
+                - the Map_Obj to plan on. The planner listens to its cell changes until detach() is called.
+            - heuristic:
+                - the heuristic function to use. Must take in two cells, e.g. heuristic(cellA, cellB), and be admissible
+                  and consistent (e.g. 'manhattan'), otherwise replanning may give a non-optimal path.
+                  Can also be the name of a built-in heuristic, see get_heuristic.
+            - connectivity:
+                - 4 or 8, whether to move only straight or also diagonally between cells.
+        """
+        self.map = map
+        self.heuristic = get_heuristic(heuristic, map)
+        self.connectivity = connectivity
+        self.width = map.int_map.shape[1]
+
+        self.start = map.get_start_pos()
+        self.stop = list(map.get_goal_pos())
+        self.start_index = self.start[0]*self.width + self.start[1]
+
+        # g is the cost found by the search, rhs the one-step lookahead cost from the neighbors
+        self.g = [inf] * map.int_map.size
+        self.rhs = [inf] * map.int_map.size
+        self.rhs[self.start_index] = 0
+
+        # km keeps old keys valid when the goal moves (instead of re-keying the whole frontier)
+        self.km = 0
+        self.frontier = IndexedHeap(map.int_map.size)
+        self.frontier.push(self.start_index, self._key(self.start_index))
+
+        # Cells with a changed cost since the last replan
+        self.changed = []
+        map.add_change_listener(self._on_cell_changed)
+
+        # Number of cells taken out of the frontier, summed over all replans
+        self.expanded = 0
+
+    def detach(self):
+        """Stops listening to changes of the map."""
+        self.map.remove_change_listener(self._on_cell_changed)
+
+    def replan(self) -> list[list[int]]:
+        """
+        Updates the search to the current goal of the map and to all changed cells, and returns the shortest path. \\
+        returns:
+            - the path as a list of cells from start to goal, or an empty list if the goal can not be reached.
+        """
+        goal = self.map.get_goal_pos()
+        if goal != self.stop:
+            # Every key may now be lower by at most the distance the goal moved
+            self.km += self.heuristic(self.stop, goal)
+            self.stop = list(goal)
+
+        for pos in self.changed:
+            index = pos[0]*self.width + pos[1]
+            # The cost of entering the cell changed, which affects the cell itself and (through g) its neighbors
+            self._update_cell(index)
+            for neighbor in self._neighbors(index):
+                self._update_cell(neighbor)
+        self.changed = []
+
+        self._compute_shortest_path()
+        return self.get_path()
+
+    def get_path(self) -> list[list[int]]:
+        """Returns the current shortest path from start to goal, following the lowest g-values back from the goal."""
+        current = self.stop[0]*self.width + self.stop[1]
+        if self.g[current] == inf:
+            return []
+        path = [current]
+        while current != self.start_index:
+            current = min(self._neighbors(current), key=lambda n: self.g[n])
+            path.append(current)
+        return [list(divmod(index, self.width)) for index in path[::-1]]
+
+    def paint_path(self, path: list[list[int]]):
+        """Draws a path returned by replan on the map."""
+        for cell in path[1:-1]:
+            self.map.str_map[cell[0], cell[1]] = ' x '
+        self.map.str_map[self.stop[0], self.stop[1]] = ' G '
+
+    def _on_cell_changed(self, pos: list[int], old_value: int, value: int):
+        self.changed.append(pos)
+
+    def _key(self, index: int) -> tuple[float, float]:
+        best = min(self.g[index], self.rhs[index])
+        return (best + self.heuristic(divmod(index, self.width), self.stop) + self.km, best)
+
+    def _neighbors(self, index: int) -> list[int]:
+        cell = divmod(index, self.width)
+        if self.connectivity == 4:
+            neighbors = self.map.get_cell_neighbors(cell)
+        else:
+            neighbors = self.map.get_cell_neighbors_8(cell)
+        return [n[0]*self.width + n[1] for n in neighbors]
+
+    def _update_cell(self, index: int):
+        """Recomputes the rhs-value of a cell, and puts it in the frontier if it is inconsistent (g != rhs)."""
+        if index != self.start_index:
+            value = int(self.map.int_map.flat[index])
+            if value == -1:
+                self.rhs[index] = inf
+            else:
+                self.rhs[index] = min((self.g[n] for n in self._neighbors(index)), default=inf) + value
+        if self.g[index] != self.rhs[index]:
+            self.frontier.push(index, self._key(index))
+        else:
+            self.frontier.remove(index)
+
+    def _compute_shortest_path(self):
+        goal = self.stop[0]*self.width + self.stop[1]
+        while not self.frontier.empty() and (self.frontier.peek()[0] < self._key(goal)
+                                             or self.rhs[goal] != self.g[goal]):
+            old_key, current = self.frontier.peek()
+            new_key = self._key(current)
+            self.expanded += 1
+
+            if old_key < new_key:
+                # Key is outdated (the goal moved), put it back with the right key
+                self.frontier.push(current, new_key)
+            elif self.g[current] > self.rhs[current]:
+                # Cost went down: settle it and update the neighbors
+                self.g[current] = self.rhs[current]
+                self.frontier.pop()
+                for neighbor in self._neighbors(current):
+                    self._update_cell(neighbor)
+            else:
+                # Cost went up: reset it, and update it and the neighbors
+                self.g[current] = inf
+                self._update_cell(current)
+                for neighbor in self._neighbors(current):
+                    self._update_cell(neighbor)
+
+
+if __name__ == "__main__":
+    import contextlib
+    import io
+    from a_star import AStar
+
+    # Task 5: replan every time the goal moves, compared to searching from scratch every time
+    map = Map_Obj(task=5)
+    planner = DStarLite(map, 'manhattan')
+    scratch = 0
+    path = planner.replan()
+    while map.get_goal_pos() != map.get_end_goal_pos():
+        for _ in range(4):
+            map.tick()
+        path = planner.replan()
+
+        fresh = Map_Obj(task=5)
+        fresh.goal_pos = fresh.end_goal_pos = list(map.get_goal_pos())
+        search = AStar(fresh)
+        with contextlib.redirect_stdout(io.StringIO()):
+            search.find_shortest_path('manhattan', use_graph=True)
+        scratch += search.expanded
+        assert search.cost[fresh.goal_pos[0], fresh.goal_pos[1]] == sum(map.get_cell_value(cell) for cell in path[1:])
+    print(f"Expanded cells: D* Lite {planner.expanded}, A* from scratch {scratch}")
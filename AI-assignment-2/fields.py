@@ -0,0 +1,118 @@
+from Map import Map_Obj
+from frontier import IndexedHeap
+from collections import OrderedDict
+from math import inf
+import hashlib
+import os
+import numpy as np
+
+# Fields computed in this process, most recently used last, see cost_field
+_cache = OrderedDict()
+CACHE_SIZE = 8
+
+
+def cost_field(map: Map_Obj, sources: list, connectivity: int = 4, reverse: bool = False,
+               cache_dir: str = None) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Computes the cost from the nearest of some source cells to every cell of the map (Dijkstra). \\
+    Fields are cached in memory (the last CACHE_SIZE), and on disk if cache_dir is given, keyed by the content
+    hash of the map, so a field is only computed again when the map changed. \\
+    params:
+        - map:
+            - the Map_Obj to compute the field of.
+        - sources:
+            - a list of cells, e.g. [[27, 18]], or a single cell.
+        - connectivity:
+            - 4 or 8, whether to move only straight or also diagonally between cells.
+        - reverse:
+            - if True, compute the cost from every cell to the nearest source instead (moving costs the value of
+              the cell moved into, so the two differ), e.g. to route many cells to the same goals.
+        - cache_dir:
+            - a directory to store the fields in, as 'field_{hash}_{...}.npz'.
+    returns:
+        - the costs, a float32 array with the shape of the map, inf for cells that can not be reached
+          (exact for costs up to 2**24).
+        - the next cell of every cell on its cheapest path, as flat indices (row*width + col) in an int32 array
+          with the shape of the map: towards the source if reverse, otherwise the parent. -1 for sources and cells
+          that can not be reached.
+    """
+    flat_sources = _flat_sources(map, sources)
+    digest = map.get_map_hash()
+    key = (digest, tuple(flat_sources), connectivity, reverse)
+    if key in _cache:
+        _cache.move_to_end(key)
+        return _cache[key]
+
+    path = None
+    if cache_dir is not None:
+        sources_digest = hashlib.sha1(np.array(flat_sources, dtype=np.int64).tobytes()).hexdigest()[:16]
+        name = f"field_{digest}_{sources_digest}_{connectivity}{'r' if reverse else ''}.npz"
+        path = os.path.join(cache_dir, name)
+    if path is not None and os.path.exists(path):
+        data = np.load(path)
+        field = data['cost'], data['next']
+    else:
+        field = _dijkstra(map, flat_sources, connectivity, reverse)
+        if path is not None:
+            np.savez_compressed(path, cost=field[0], next=field[1])
+
+    # The cached arrays are shared, so they can not be changed
+    for array in field:
+        array.setflags(write=False)
+    _cache[key] = field
+    if len(_cache) > CACHE_SIZE:
+        _cache.popitem(last=False)
+    return field
+
+
+def dijkstra(map: Map_Obj, sources: list, connectivity: int = 4,
+             reverse: bool = False) -> tuple[np.ndarray, np.ndarray]:
+    """The same as cost_field, but always computing the field (and not caching it)."""
+    return _dijkstra(map, _flat_sources(map, sources), connectivity, reverse)
+
+
+def _flat_sources(map: Map_Obj, sources: list) -> list[int]:
+    """The flat indices of a list of cells (or a single cell), sorted and without duplicates."""
+    if isinstance(sources[0], (int, np.integer)):
+        sources = [sources]
+    width = map.int_map.shape[1]
+    return sorted({int(s[0])*width + int(s[1]) for s in sources})
+
+
+def _dijkstra(map: Map_Obj, sources: list[int], connectivity: int, reverse: bool) -> tuple[np.ndarray, np.ndarray]:
+    """Multi-source Dijkstra over the neighbor table of the map, from flat source indices."""
+    offsets, targets, costs = (a.tolist() for a in map.get_neighbor_graph(connectivity))
+    values = map.int_map.ravel().tolist()
+    dist = [inf] * len(values)
+    parent = [-1] * len(values)
+    frontier = IndexedHeap(len(values))
+    for source in sources:
+        dist[source] = 0
+        frontier.push(source, 0)
+
+    while not frontier.empty():
+        d, current = frontier.pop()
+        for edge in range(offsets[current], offsets[current + 1]):
+            neighbor = targets[edge]
+            # Backwards, the step neighbor -> current costs the value of current
+            new_dist = d + (values[current] if reverse else costs[edge])
+            if new_dist < dist[neighbor]:
+                dist[neighbor] = new_dist
+                parent[neighbor] = current
+                frontier.push(neighbor, new_dist)
+
+    shape = map.int_map.shape
+    return np.array(dist, dtype=np.float32).reshape(shape), np.array(parent, dtype=np.int32).reshape(shape)
+
+
+if __name__ == "__main__":
+    import time
+
+    # The cost from every cell to the nearest exit of the Edgar map, computed once and then taken from the cache
+    map = Map_Obj(task=4)
+    exits = [map.get_start_pos(), map.get_goal_pos()]
+    for attempt in ('computed', 'cached'):
+        t0 = time.perf_counter()
+        cost, next_cell = cost_field(map, exits, 8, reverse=True)
+        print(f"{attempt}: {(time.perf_counter() - t0) * 1000:.1f} ms, "
+              f"{np.isfinite(cost).sum()} cells reach an exit, the farthest costs {cost[np.isfinite(cost)].max():.0f}")
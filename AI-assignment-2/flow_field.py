@@ -0,0 +1,174 @@
+from Map import Map_Obj
+from frontier import IndexedHeap
+from fields import cost_field
+import numpy as np
+
+
+class FlowField:
+    def __init__(self, map: Map_Obj, connectivity: int = 4) -> None:
+        """
+        Initializes a flow field towards the goal of a Map_Obj: the cost from every cell to the goal (the integration
+        field), and the next cell to move to from every cell (the direction field). Any number of agents can then
+        take their next step towards the goal in O(1) with next_step, instead of each running its own search. \\
+        The field follows the goal of the map (task 5) through update(). When the goal moves to a neighboring cell
+        the field is repaired instead of rebuilt: only the cells that get cheaper through the new goal are visited.
+        A changed cell cost (through set_cell_value/replace_map_values) makes the next update rebuild the field. \\
+        params:
+            - map:
+                - the Map_Obj to compute the field on. The field listens to its cell changes until detach() is called.
+            - connectivity:
+                - 4 or 8, whether to move only straight or also diagonally between cells.
+        """
+        self.map = map
+        self.connectivity = connectivity
+        self.width = map.int_map.shape[1]
+
+        self.goal = None
+        self.changed = False
+        map.add_change_listener(self._on_cell_changed)
+
+        # Number of cells visited by repairs, summed over all updates
+        self.repaired = 0
+        self._directions = None
+        self._rebuild()
+
+    def detach(self):
+        """Stops listening to changes of the map."""
+        self.map.remove_change_listener(self._on_cell_changed)
+
+    def update(self) -> int:
+        """
+        Moves the field to the current goal of the map, e.g. after map.tick(). \\
+        returns:
+            - the number of cells whose cost or direction was updated (all of them if the field was rebuilt).
+        """
+        goal = tuple(self.map.get_goal_pos())
+        if self.changed:
+            self._rebuild()
+            return self.map.int_map.size
+        if goal == self.goal:
+            return 0
+
+        # The goal moved from old to new, and reaching new from old costs the value of new if they are neighbors
+        old, new = self.goal[0]*self.width + self.goal[1], goal[0]*self.width + goal[1]
+        offsets, targets, _ = self.map.get_neighbor_graph(self.connectivity)
+        if new not in targets[offsets[old]:offsets[old + 1]]:
+            self._rebuild()
+            return self.map.int_map.size
+
+        repaired = self._repair(old, new)
+        self.goal = goal
+        self.repaired += repaired
+        self._directions = None
+        return repaired
+
+    def next_step(self, pos: list[int]) -> list[int]:
+        """Returns the cell to move to from pos towards the goal, pos itself at the goal, or None if it can not be reached."""
+        index = self.next[pos[0], pos[1]]
+        if index == -1:
+            return list(pos) if self.cost[pos[0], pos[1]] == 0 else None
+        return list(divmod(int(index), self.width))
+
+    def get_cost(self, pos: list[int]) -> float:
+        """Returns the cost of moving from pos to the goal, inf if it can not be reached."""
+        return float(self.cost[pos[0], pos[1]])
+
+    def get_path(self, pos: list[int]) -> np.ndarray:
+        """Returns the path from pos to the goal, as an int32 array of shape (n, 2), empty if it can not be reached."""
+        if not np.isfinite(self.cost[pos[0], pos[1]]):
+            return np.empty((0, 2), dtype=np.int32)
+        next_flat = self.next.ravel()
+        path = [pos[0]*self.width + pos[1]]
+        while next_flat[path[-1]] != -1:
+            path.append(int(next_flat[path[-1]]))
+        return np.column_stack(np.divmod(path, self.width)).astype(np.int32)
+
+    @property
+    def directions(self) -> np.ndarray:
+        """The direction field, an int8 array of shape (height, width, 2) with the (row, col) step of every cell, (0, 0)
+        at the goal and for cells that can not reach it."""
+        if self._directions is None:
+            rows, cols = np.divmod(self.next, self.width)
+            grid_rows, grid_cols = np.indices(self.next.shape)
+            directions = np.stack((rows - grid_rows, cols - grid_cols), axis=-1).astype(np.int8)
+            directions[self.next == -1] = 0
+            self._directions = directions
+        return self._directions
+
+    def _rebuild(self):
+        """Computes the whole field again, for the current goal of the map."""
+        self.goal = tuple(self.map.get_goal_pos())
+        cost, next_cell = cost_field(self.map, self.goal, self.connectivity, reverse=True)
+        # The cached field is shared, so the repairs work on a copy
+        self.cost, self.next = cost.copy(), next_cell.copy()
+        self.changed = False
+        self._directions = None
+
+    def _repair(self, old: int, new: int) -> int:
+        """
+        Moves the field from the goal old to its neighbor new. \\
+        Going through old to new costs every cell the value of new more than before, so those costs stay valid
+        (as upper bounds) and only the cells that are cheaper without going through old are improved, with a
+        Dijkstra search from new that stops at cells that do not improve.
+        """
+        cost, next_flat = self.cost.ravel(), self.next.ravel()
+        offsets, targets, _ = (a.tolist() for a in self.map.get_neighbor_graph(self.connectivity))
+        values = self.map.int_map.ravel().tolist()
+        cost += values[new]
+        cost[new] = 0
+        next_flat[old] = new
+        next_flat[new] = -1
+
+        repaired = 0
+        frontier = IndexedHeap(len(values))
+        frontier.push(new, 0)
+        while not frontier.empty():
+            d, current = frontier.pop()
+            repaired += 1
+            # Backwards, the step neighbor -> current costs the value of current
+            new_cost = d + values[current]
+            for edge in range(offsets[current], offsets[current + 1]):
+                neighbor = targets[edge]
+                if new_cost < cost[neighbor]:
+                    cost[neighbor] = new_cost
+                    next_flat[neighbor] = current
+                    frontier.push(neighbor, new_cost)
+        return repaired
+
+    def _on_cell_changed(self, pos: list[int], old_value: int, value: int):
+        self.changed = True
+
+
+if __name__ == "__main__":
+    import contextlib
+    import io
+    import random
+    import time
+    from a_star import AStar
+
+    # Task 5: a hundred agents chase the moving goal with one flow field, compared to an A* search per agent and move
+    map = Map_Obj(task=5)
+    field = FlowField(map)
+    open_cells = np.argwhere(map.int_map != -1).tolist()
+    agents = [cell for cell in random.Random(5).sample(open_cells, 100) if np.isfinite(field.get_cost(cell))]
+
+    t0 = time.perf_counter()
+    moves = 0
+    while map.get_goal_pos() != map.get_end_goal_pos():
+        map.tick()
+        field.update()
+        agents = [field.next_step(agent) for agent in agents]
+        moves += len(agents)
+    field_time = time.perf_counter() - t0
+
+    # One A* search to the goal per agent, on a sample of the moves
+    t0 = time.perf_counter()
+    for agent in agents[:20]:
+        fresh = Map_Obj(task=5)
+        fresh.start_pos, fresh.end_goal_pos = agent, fresh.goal_pos
+        with contextlib.redirect_stdout(io.StringIO()):
+            AStar(fresh, headless=True).find_shortest_path('manhattan', use_graph=True)
+    search_time = (time.perf_counter() - t0) / 20
+
+    print(f"Flow field: {moves} moves in {field_time * 1000:.0f} ms ({field.repaired} cells repaired), "
+          f"A*: {search_time * 1000:.2f} ms per move")
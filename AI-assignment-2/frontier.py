@@ -0,0 +1,136 @@
+from array import array
+from search_state import SparseArray
+
+
+class IndexedHeap:
+    def __init__(self, size: int, sparse: bool = False) -> None:
+        """
+        Initializes an indexed binary min-heap, used as the frontier of the search. \\
+        Every item is a flat cell index (row*width + col), and every index is in the heap at most once,
+        so re-adding a cell updates its priority (decrease-key) instead of leaving a stale duplicate behind. \\
+        params:
+            - size:
+                - the number of possible indices, e.g. the number of cells in the map.
+            - sparse:
+                - if True, keep the heap positions in a dictionary instead of an array of `size` entries.
+        """
+        self.items = []         # heap-ordered flat indices
+        self.prios = []         # priority of the item at the same heap position
+        # heap position of every index, -1 if it is not in the heap
+        self.pos = SparseArray(-1) if sparse else array('i', [-1]) * size
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def __contains__(self, index: int) -> bool:
+        return self.pos[index] != -1
+
+    def empty(self) -> bool:
+        """Returns True if the heap has no items."""
+        return not self.items
+
+    def push(self, index: int, prio: float):
+        """
+        Adds an index to the heap, or moves it to its new priority if it is already in the heap. \\
+        params:
+            - index:
+                - the flat index to add.
+            - prio:
+                - the priority of the index (lowest is popped first).
+        """
+        i = self.pos[index]
+        if i == -1:
+            self.items.append(index)
+            self.prios.append(prio)
+            self.pos[index] = len(self.items) - 1
+            self._sift_up(len(self.items) - 1)
+        elif prio < self.prios[i]:
+            self.prios[i] = prio
+            self._sift_up(i)
+        elif prio > self.prios[i]:
+            self.prios[i] = prio
+            self._sift_down(i)
+
+    def decrease_key(self, index: int, prio: float) -> bool:
+        """
+        Lowers the priority of an index, adding it if it is not in the heap. \\
+        Returns False (and does nothing) if the index already has a lower or equal priority.
+        """
+        i = self.pos[index]
+        if i != -1 and self.prios[i] <= prio:
+            return False
+        self.push(index, prio)
+        return True
+
+    def remove(self, index: int) -> bool:
+        """Removes an index from the heap. Returns False if it was not in the heap."""
+        i = self.pos[index]
+        if i == -1:
+            return False
+        items, prios = self.items, self.prios
+        last_index, last_prio = items.pop(), prios.pop()
+        self.pos[index] = -1
+        if i < len(items):
+            # Fill the hole with the last item, and move it to where it belongs
+            items[i], prios[i] = last_index, last_prio
+            self.pos[last_index] = i
+            self._sift_up(i)
+            self._sift_down(self.pos[last_index])
+        return True
+
+    def peek(self) -> tuple[float, int]:
+        """Returns the (priority, index) with the lowest priority without removing it."""
+        return self.prios[0], self.items[0]
+
+    def pop(self) -> tuple[float, int]:
+        """Removes and returns the (priority, index) with the lowest priority."""
+        items, prios = self.items, self.prios
+        index, prio = items[0], prios[0]
+        last_index, last_prio = items.pop(), prios.pop()
+        self.pos[index] = -1
+        if items:
+            items[0], prios[0] = last_index, last_prio
+            self.pos[last_index] = 0
+            self._sift_down(0)
+        return prio, index
+
+    def clear(self):
+        """Removes all items, resetting only the positions that were in use."""
+        for index in self.items:
+            self.pos[index] = -1
+        self.items.clear()
+        self.prios.clear()
+
+    def _sift_up(self, i: int):
+        items, prios, pos = self.items, self.prios, self.pos
+        index, prio = items[i], prios[i]
+        while i > 0:
+            parent = (i - 1) >> 1
+            if prios[parent] <= prio:
+                break
+            # Move parent down into the hole
+            items[i], prios[i] = items[parent], prios[parent]
+            pos[items[i]] = i
+            i = parent
+        items[i], prios[i] = index, prio
+        pos[index] = i
+
+    def _sift_down(self, i: int):
+        items, prios, pos = self.items, self.prios, self.pos
+        n = len(items)
+        index, prio = items[i], prios[i]
+        while True:
+            child = 2 * i + 1
+            if child >= n:
+                break
+            # Pick the smallest child
+            if child + 1 < n and prios[child + 1] < prios[child]:
+                child += 1
+            if prios[child] >= prio:
+                break
+            # Move child up into the hole
+            items[i], prios[i] = items[child], prios[child]
+            pos[items[i]] = i
+            i = child
+        items[i], prios[i] = index, prio
+        pos[index] = i
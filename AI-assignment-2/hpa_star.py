@@ -0,0 +1,323 @@
+from Map import Map_Obj
+from a_star import AStar
+from frontier import IndexedHeap
+import os
+import numpy as np
+
+# Version of the abstraction stored in the cache files, caches of another version are built again
+CACHE_VERSION = 2
+
+
+class HierarchicalAStar:
+    def __init__(self, map: Map_Obj, cluster_size: int = 10, connectivity: int = 4, cache: bool = True) -> None:
+        """
+        Initializes hierarchical pathfinding (HPA*), using a Map_Obj. \\
+        The map is split into square clusters. Where two clusters touch, entrance cells are picked on both
+        sides of every open stretch of their border, and the costs between all entrances of a cluster are
+        precomputed. Long queries are then searched on this small abstract graph, and only refined to cells
+        (with AStar, inside one cluster at a time) along the found route. Paths are not always shortest: they
+        only cross borders at entrances, which costs up to 16% more than A* on the Samfundet maps. \\
+        params:
+            - map:
+                - the Map_Obj to find paths on. Cell changes (set_cell_value/replace_map_values) are applied to
+                  the abstraction by recomputing only the clusters around the changed cell.
+            - cluster_size:
+                - width and height of a cluster in cells.
+            - connectivity:
+                - 4 or 8. With 8-connectedness, borders are also crossed diagonally where no straight crossing next
+                  to the step can replace it, and clusters that only touch at a corner are connected through it.
+            - cache:
+                - if True, the abstraction is stored next to the map file (keyed by the content of the map), and
+                  loaded from there the next time.
+        """
+        self.map = map
+        self.cluster_size = cluster_size
+        self.connectivity = connectivity
+        self.height, self.width = map.int_map.shape
+        self.clusters_y = -(-self.height // cluster_size)
+        self.clusters_x = -(-self.width // cluster_size)
+
+        # transitions[(c1, c2)]: list of (a, b) cell pairs crossing the border between clusters c1 < c2
+        # intra[c]: {(u, v): cost} between all entrances of cluster c
+        self.transitions = {}
+        self.intra = {}
+        self._searches = {}
+        self._graph = None
+        self.frontier = IndexedHeap(map.int_map.size)
+
+        self.cache_path = None
+        if cache and map.path_to_map is not None:
+            self.cache_path = f"{os.path.splitext(map.path_to_map)[0]}.hpa{cluster_size}x{connectivity}.npz"
+        if not self._load_cache():
+            self._build()
+            self._save_cache()
+
+        map.add_change_listener(self._on_cell_changed)
+
+    def detach(self):
+        """Stops listening to changes of the map."""
+        self.map.remove_change_listener(self._on_cell_changed)
+
+    def find_path(self, start: list[int] = None, goal: list[int] = None) -> np.ndarray:
+        """
+        Finds a path from start to goal. \\
+        params:
+            - start, goal:
+                - the cells to find a path between, by default the start and goal of the map.
+        returns:
+            - the path as an int32 array of shape (n, 2) going from start to goal, empty (0, 2) if there is none.
+        """
+        start = self.map.get_start_pos() if start is None else start
+        goal = self.map.get_goal_pos() if goal is None else goal
+        empty = np.zeros((0, 2), dtype=np.int32)
+        if self.map.int_map[start[0], start[1]] == -1 or self.map.int_map[goal[0], goal[1]] == -1:
+            return empty
+
+        route = self._abstract_search(start[0]*self.width + start[1], goal[0]*self.width + goal[1])
+        if route is None:
+            return empty
+        return self._refine(route)
+
+    # --- Abstraction ---
+
+    def _cluster_of(self, index: int) -> int:
+        r, c = divmod(index, self.width)
+        return (r // self.cluster_size) * self.clusters_x + c // self.cluster_size
+
+    def _cluster_bounds(self, cluster: int) -> tuple[int, int, int, int]:
+        """Returns the (top, left, bottom, right) cells of a cluster, bottom and right excluded."""
+        cy, cx = divmod(cluster, self.clusters_x)
+        top, left = cy * self.cluster_size, cx * self.cluster_size
+        return top, left, min(top + self.cluster_size, self.height), min(left + self.cluster_size, self.width)
+
+    def _cluster_neighbors(self, cluster: int) -> list[int]:
+        """The clusters sharing a border with a cluster, and with 8-connectedness also those sharing a corner."""
+        cy, cx = divmod(cluster, self.clusters_x)
+        diagonal = self.connectivity == 8
+        neighbors = []
+        for dy, dx in ((-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1)):
+            if (diagonal or not (dy and dx)) and 0 <= cy + dy < self.clusters_y and 0 <= cx + dx < self.clusters_x:
+                neighbors.append((cy + dy)*self.clusters_x + cx + dx)
+        return neighbors
+
+    def _entrances(self, cluster: int) -> list[int]:
+        """All entrance cells of a cluster."""
+        cells = set()
+        for other in self._cluster_neighbors(cluster):
+            for a, b in self.transitions.get((min(cluster, other), max(cluster, other)), []):
+                cells.add(a if self._cluster_of(a) == cluster else b)
+        return sorted(cells)
+
+    def _find_transitions(self, c1: int, c2: int) -> list[tuple[int, int]]:
+        """Picks the entrance pairs on the border between two neighboring clusters c1 < c2."""
+        int_map = self.map.int_map
+        top, left, bottom, right = self._cluster_bounds(c1)
+        (cy1, cx1), (cy2, cx2) = divmod(c1, self.clusters_x), divmod(c2, self.clusters_x)
+
+        def is_open(index):
+            return int_map.flat[index] != -1
+
+        if cy1 != cy2 and cx1 != cx2:
+            # c2 is diagonally below: the clusters only touch at a corner, crossed by one diagonal step
+            if cx2 > cx1:
+                pair = ((bottom - 1)*self.width + right - 1, bottom*self.width + right)
+            else:
+                pair = ((bottom - 1)*self.width + left, bottom*self.width + left - 1)
+            return [pair] if is_open(pair[0]) and is_open(pair[1]) else []
+        if cy1 == cy2:
+            # c2 is to the right: the border is the column pair (right - 1, right)
+            pairs = [(r*self.width + right - 1, r*self.width + right) for r in range(top, bottom)]
+        else:
+            # c2 is below: the border is the row pair (bottom - 1, bottom)
+            pairs = [((bottom - 1)*self.width + c, bottom*self.width + c) for c in range(left, right)]
+
+        # Split the border into open stretches, and pick entrances for every stretch
+        transitions, stretch = [], []
+        for pair in pairs + [None]:
+            if pair is not None and is_open(pair[0]) and is_open(pair[1]):
+                stretch.append(pair)
+                continue
+            if len(stretch) >= 6:
+                transitions += [stretch[0], stretch[-1]]
+            elif stretch:
+                transitions.append(stretch[len(stretch) // 2])
+            stretch = []
+
+        if self.connectivity == 8:
+            # A diagonal step (a1, b2) can be replaced by the straight crossing (a1, b1) then b1 -> b2, or by
+            # a1 -> a2 then (a2, b2), both inside the clusters. Only where both are walled off it is an entrance.
+            for (a1, b1), (a2, b2) in zip(pairs, pairs[1:]):
+                if is_open(a1) and is_open(b2) and not is_open(b1) and not is_open(a2):
+                    transitions.append((a1, b2))
+                if is_open(a2) and is_open(b1) and not is_open(a1) and not is_open(b2):
+                    transitions.append((a2, b1))
+        return transitions
+
+    def _search_in(self, cluster: int) -> AStar:
+        """The AStar used for searches inside a cluster, working on a view of the map."""
+        if cluster not in self._searches:
+            top, left, bottom, right = self._cluster_bounds(cluster)
+            local = Map_Obj.from_array(self.map.int_map[top:bottom, left:right], [0, 0], [0, 0])
+            self._searches[cluster] = AStar(local, self.connectivity)
+        return self._searches[cluster]
+
+    def _local_paths(self, cluster: int, queries: list[tuple[int, int]]) -> list[np.ndarray]:
+        """Shortest paths between flat map indices inside a cluster, as (n, 2) arrays of map cells."""
+        top, left, _, _ = self._cluster_bounds(cluster)
+        local = [([u // self.width - top, u % self.width - left], [v // self.width - top, v % self.width - left])
+                 for u, v in queries]
+        paths, _ = self._search_in(cluster).find_paths(local)
+        return [path + [top, left] for path in paths]
+
+    def _path_cost(self, path: np.ndarray) -> int:
+        return int(self.map.int_map[path[1:, 0], path[1:, 1]].sum())
+
+    def _compute_intra(self, cluster: int):
+        """Precomputes the cost from every entrance of a cluster to every other one (inside the cluster)."""
+        entrances = self._entrances(cluster)
+        queries = [(u, v) for u in entrances for v in entrances if u != v]
+        self.intra[cluster] = {query: self._path_cost(path)
+                               for query, path in zip(queries, self._local_paths(cluster, queries)) if len(path)}
+
+    def _build(self):
+        clusters = self.clusters_y * self.clusters_x
+        for c1 in range(clusters):
+            for c2 in self._cluster_neighbors(c1):
+                if c1 < c2:
+                    self.transitions[(c1, c2)] = self._find_transitions(c1, c2)
+        for cluster in range(clusters):
+            self._compute_intra(cluster)
+        self._graph = None
+
+    def _on_cell_changed(self, pos: list[int], old_value: int, value: int):
+        """Recomputes the clusters around a changed cell."""
+        cluster = self._cluster_of(pos[0]*self.width + pos[1])
+        self._searches.pop(cluster, None)
+        changed = {cluster}
+        for other in self._cluster_neighbors(cluster):
+            key = (min(cluster, other), max(cluster, other))
+            transitions = self._find_transitions(*key)
+            if transitions != self.transitions[key]:
+                self.transitions[key] = transitions
+                changed.add(other)
+        for c in changed:
+            self._compute_intra(c)
+        self._graph = None
+
+    def _abstract_graph(self) -> dict[int, list[tuple[int, int]]]:
+        """The abstract graph as {node: [(neighbor, cost), ...]}, built from transitions and intra costs."""
+        if self._graph is None:
+            graph = {}
+            for transitions in self.transitions.values():
+                for a, b in transitions:
+                    graph.setdefault(a, []).append((b, int(self.map.int_map.flat[b])))
+                    graph.setdefault(b, []).append((a, int(self.map.int_map.flat[a])))
+            for edges in self.intra.values():
+                for (u, v), cost in edges.items():
+                    graph.setdefault(u, []).append((v, cost))
+            self._graph = graph
+        return self._graph
+
+    # --- Queries ---
+
+    def _abstract_search(self, start: int, goal: int) -> list[int]:
+        """A* on the abstract graph, with the start and goal connected to the entrances of their clusters."""
+        graph = self._abstract_graph()
+        start_cluster, goal_cluster = self._cluster_of(start), self._cluster_of(goal)
+
+        # Temporary edges of the query
+        extra = {start: [], goal: []}
+        out_of_start = [e for e in self._entrances(start_cluster) if e != start]
+        for (_, v), path in zip([(start, v) for v in out_of_start],
+                                self._local_paths(start_cluster, [(start, v) for v in out_of_start])):
+            if len(path):
+                extra[start].append((v, self._path_cost(path)))
+        into_goal = [e for e in self._entrances(goal_cluster) if e != goal]
+        for u, path in zip(into_goal, self._local_paths(goal_cluster, [(u, goal) for u in into_goal])):
+            if len(path):
+                extra.setdefault(u, []).append((goal, self._path_cost(path)))
+        if start_cluster == goal_cluster:
+            path = self._local_paths(start_cluster, [(start, goal)])[0]
+            if len(path):
+                extra[start].append((goal, self._path_cost(path)))
+
+        goal_cell = divmod(goal, self.width)
+
+        def heuristic(index):
+            r, c = divmod(index, self.width)
+            dr, dc = abs(r - goal_cell[0]), abs(c - goal_cell[1])
+            return dr + dc if self.connectivity == 4 else max(dr, dc)
+
+        cost, parent = {start: 0}, {}
+        frontier = self.frontier
+        frontier.clear()
+        frontier.push(start, heuristic(start))
+        while not frontier.empty():
+            current = frontier.pop()[1]
+            if current == goal:
+                route = [goal]
+                while route[-1] != start:
+                    route.append(parent[route[-1]])
+                return route[::-1]
+            for neighbor, edge_cost in graph.get(current, []) + extra.get(current, []):
+                new_cost = cost[current] + edge_cost
+                if neighbor not in cost or new_cost < cost[neighbor]:
+                    cost[neighbor] = new_cost
+                    parent[neighbor] = current
+                    frontier.push(neighbor, new_cost + heuristic(neighbor))
+        return None
+
+    def _refine(self, route: list[int]) -> np.ndarray:
+        """Turns a route of abstract nodes into cells, searching between consecutive nodes inside their cluster."""
+        parts = [np.array([divmod(route[0], self.width)], dtype=np.int32)]
+        for u, v in zip(route, route[1:]):
+            if self._cluster_of(u) != self._cluster_of(v):
+                # Border crossing: the cells are neighbors (straight or diagonal)
+                parts.append(np.array([divmod(v, self.width)], dtype=np.int32))
+            else:
+                parts.append(self._local_paths(self._cluster_of(u), [(u, v)])[0][1:].astype(np.int32))
+        return np.concatenate(parts)
+
+    # --- Cache ---
+
+    def _load_cache(self) -> bool:
+        if self.cache_path is None or not os.path.exists(self.cache_path):
+            return False
+        data = np.load(self.cache_path)
+        if 'version' not in data.files or int(data['version']) != CACHE_VERSION \
+                or str(data['hash']) != self.map.get_map_hash():
+            return False
+        for c1, c2, a, b in data['transitions'].tolist():
+            self.transitions.setdefault((c1, c2), []).append((a, b))
+        for c1 in range(self.clusters_y * self.clusters_x):
+            for c2 in self._cluster_neighbors(c1):
+                self.transitions.setdefault((min(c1, c2), max(c1, c2)), [])
+        self.intra = {c: {} for c in range(self.clusters_y * self.clusters_x)}
+        for u, v, cost in data['intra'].tolist():
+            self.intra[self._cluster_of(u)][(u, v)] = cost
+        return True
+
+    def _save_cache(self):
+        if self.cache_path is None:
+            return
+        transitions = [(c1, c2, a, b) for (c1, c2), pairs in self.transitions.items() for a, b in pairs]
+        intra = [(u, v, cost) for edges in self.intra.values() for (u, v), cost in edges.items()]
+        np.savez_compressed(self.cache_path, version=CACHE_VERSION, hash=self.map.get_map_hash(),
+                            transitions=np.array(transitions, dtype=np.int64).reshape(-1, 4),
+                            intra=np.array(intra, dtype=np.int64).reshape(-1, 3))
+
+
+if __name__ == "__main__":
+    import time
+
+    # Query time and path cost of HPA* compared to A* (as a batch of one) on every task
+    for task in range(1, 6):
+        map = Map_Obj(task=task)
+        t0 = time.perf_counter()
+        hpa = HierarchicalAStar(map, cache=False)
+        t1 = time.perf_counter()
+        path = hpa.find_path()
+        t2 = time.perf_counter()
+        reference = AStar(map).find_paths([(map.get_start_pos(), map.get_goal_pos())])[0][0]
+        print(f"task {task}: build {(t1 - t0)*1000:.1f} ms, query {(t2 - t1)*1000:.1f} ms, "
+              f"cost {hpa._path_cost(path)} (A*: {hpa._path_cost(reference)})")
@@ -0,0 +1,151 @@
+from Map import Map_Obj
+from a_star import AStar, EXPLORED
+from search_stats import SearchStats
+from math import inf
+import numpy as np
+
+
+def goal_schedule(map: Map_Obj) -> tuple[list[list[int]], list[int]]:
+    """
+    Predicts where the goal of the map will be, from pick_move and tick. \\
+    returns:
+        - the positions the goal will visit (see Map_Obj.get_goal_trajectory).
+        - the number of ticks from now after which the goal is at each of them: tick moves the goal on every call
+          where its counter is a multiple of 4.
+    """
+    trajectory = map.get_goal_trajectory()
+    first = -map.tick_counter % 4
+    return trajectory, [0] + [first + 4*j + 1 for j in range(len(trajectory) - 1)]
+
+
+class Interception(AStar):
+    def __init__(self, map: Map_Obj, connectivity: int = 4, headless: bool = False) -> None:
+        """
+        Initializes a planner that meets the moving goal of task 5 where it will be, instead of chasing it. \\
+        The goal is predicted with goal_schedule. Time is counted in ticks, and moving into a cell takes as many
+        ticks as the cell costs, so the earliest meeting is also the cheapest one. The search runs over (cell, time)
+        states, but the agent may wait in a cell, so arriving at a cell earlier is never worse than arriving later:
+        only the earliest time of every cell is kept, and the time layers collapse into one search over the cells. \\
+        params:
+            - map:
+                - the Map_Obj to plan on. The map is not ticked by the search.
+            - connectivity:
+                - 4 or 8, whether to move only straight or also diagonally between cells.
+            - headless:
+                - if True, only record the explored cells and path, see AStar.
+        """
+        super().__init__(map, connectivity, headless)
+        self.meet_time = -1
+
+    @property
+    def times(self) -> np.ndarray:
+        """The tick the agent reaches every cell of `path` at, as an int32 array. It waits in the last cell until
+        meet_time."""
+        return np.array([self.state.g[index] for index in self._path_indices()], dtype=np.int32)
+
+    def find_interception(self, stats: SearchStats = None) -> SearchStats:
+        """
+        Finds the earliest meeting with the goal, and draws the path to the meeting cell on the map. \\
+        The meeting cell and time are in `stop` and `meet_time`, the path in `path` and `times`. \\
+        params:
+            - stats:
+                - the SearchStats to fill in, see AStar.find_shortest_path. The cost is the meeting time.
+        returns:
+            - the SearchStats of the search.
+        """
+        stats = stats or SearchStats()
+        stats.begin('interception')
+        trajectory, arrive = goal_schedule(self.map)
+        # The goal is at trajectory[j] from tick arrive[j] until (not including) leave[j]
+        leave = arrive[1:] + [inf]
+        window = {pos[0]*self.width + pos[1]: j for j, pos in enumerate(trajectory)}
+        min_cost = self.map.get_min_cost()
+        values = self.map.int_map.ravel().tolist()
+        if self.connectivity == 4:
+            def steps(r, c, pos):
+                return abs(r - pos[0]) + abs(c - pos[1])
+        else:
+            def steps(r, c, pos):
+                return max(abs(r - pos[0]), abs(c - pos[1]))
+
+        def estimate(index: int, t: int) -> float:
+            # Earliest meeting from (index, t) if there were no walls, and every cell on the way cost the least
+            r, c = divmod(index, self.width)
+            best = inf
+            for j, pos in enumerate(trajectory):
+                distance = steps(r, c, pos)
+                if distance:
+                    distance = (distance - 1)*min_cost + values[pos[0]*self.width + pos[1]]
+                if t + distance < leave[j]:
+                    best = min(best, max(t + distance, arrive[j]))
+            return best - t
+        estimate = stats.timed(estimate, 'heuristic')
+
+        offsets, targets, costs = (a.tolist() for a in self.map.get_neighbor_graph(self.connectivity))
+        frontier = stats.timed_frontier(self.frontier)
+        g, parent, stamp = self.state.g, self.state.parent, self.state.stamp
+        reached = self.state.generation
+        pushes = reopened = peak = 0
+        sample_every = stats.sample_every
+
+        start = self.start[0]*self.width + self.start[1]
+        best, meeting = inf, -1
+        if start in window and 0 < leave[window[start]]:
+            best, meeting = arrive[window[start]], start
+        frontier.push(start, estimate(start, 0))
+
+        while not frontier.empty():
+            if len(frontier) > peak:
+                peak = len(frontier)
+            f, index = frontier.pop()
+            # No state left in the frontier can meet the goal earlier
+            if f >= best:
+                break
+            stamp[index] = reached + 1
+            self.expanded += 1
+            if sample_every and self.expanded % sample_every == 0:
+                stats.sample(self.expanded, len(frontier))
+
+            for edge in range(offsets[index], offsets[index + 1]):
+                neighbor = targets[edge]
+                t = g[index] + costs[edge]
+                if stamp[neighbor] < reached or t < g[neighbor]:
+                    if self.headless:
+                        self.explored[neighbor] = EXPLORED
+                    else:
+                        self.map.str_map[divmod(neighbor, self.width)] = ' - '
+                    if stamp[neighbor] == reached + 1:
+                        reopened += 1
+                    g[neighbor] = t
+                    parent[neighbor] = index
+                    stamp[neighbor] = reached
+
+                    # Reaching the trajectory before the goal leaves it: wait there for the goal
+                    j = window.get(neighbor)
+                    if j is not None and t < leave[j] and max(t, arrive[j]) < best:
+                        best, meeting = max(t, arrive[j]), neighbor
+                    frontier.push(neighbor, t + estimate(neighbor, t))
+                    pushes += 1
+
+        stats.pushes, stats.reopened, stats.peak_frontier = pushes, reopened, peak
+        self.meet_time = best if meeting != -1 else -1
+        if meeting != -1:
+            self.stop = list(divmod(meeting, self.width))
+        stats.end(self.expanded, self.meet_time)
+        self._paint_path()
+        return stats
+
+
+if __name__ == "__main__":
+    import contextlib
+    import io
+
+    # Task 5: intercepting the goal compared to chasing it with A*
+    for connectivity in (4, 8):
+        chase = AStar(Map_Obj(task=5), connectivity, headless=True)
+        with contextlib.redirect_stdout(io.StringIO()):
+            chase.find_shortest_path('manhattan' if connectivity == 4 else 'chebyshev')
+        intercept = Interception(Map_Obj(task=5), connectivity, headless=True)
+        stats = intercept.find_interception()
+        print(f"{connectivity}-connected: chasing expanded {chase.expanded} cells, intercepting {intercept.expanded} "
+              f"(meeting at {intercept.stop} after {intercept.meet_time} ticks)")
@@ -0,0 +1,247 @@
+from Map import Map_Obj
+from a_star import AStar, EXPLORED, get_heuristic
+from search_stats import SearchStats
+from typing import Callable, Union
+import numpy as np
+
+
+class JumpPointSearch(AStar):
+    def __init__(self, map: Map_Obj, connectivity: int = 4, headless: bool = False) -> None:
+        """
+        Initializes Jump Point Search (JPS), using a Map_Obj. \\
+        Inside regions where all cells have the same cost, JPS skips over (jumps) every cell that
+        does not change the shape of the path, and only adds the cells where the path may turn to the frontier.
+        Cells next to a cell of a different cost, and the cells the goal will move through, are expanded
+        like in ordinary A*, so the found path has the same cost as with AStar. \\
+        params:
+            - map:
+                - the Map_Obj to find the shortest path of, given a start and a goal.
+            - connectivity:
+                - 4 or 8, matching Map_Obj.get_cell_neighbors and Map_Obj.get_cell_neighbors_8.
+            - headless:
+                - if True, only record the explored cells and path, see AStar.
+        """
+        super().__init__(map, connectivity, headless)
+        self.height = map.int_map.shape[0]
+        self.grid = map.int_map.tolist()
+
+        # A cell stops every jump if a neighbor (also diagonal) has another (non-wall) cost
+        padded = np.pad(map.int_map, 1, constant_values=-1)
+        stops = np.zeros(map.int_map.shape, dtype=bool)
+        for dr in (-1, 0, 1):
+            for dc in (-1, 0, 1):
+                nb = padded[1+dr:1+dr+self.height, 1+dc:1+dc+self.width]
+                stops |= (nb != -1) & (nb != map.int_map)
+        stops &= map.int_map != -1
+
+        # ... and so does every position the (moving) goal will visit
+        for pos in map.get_goal_trajectory():
+            stops[pos[0], pos[1]] = True
+        self.stops = stops.tolist()
+
+        # Direction every cell in the frontier was reached from, None for ordinary expansion
+        self.direction = {}
+
+    def find_shortest_path(self, heuristic: Union[str, Callable], heuristic_weight: float = 1.0,
+                           stats: SearchStats = None) -> SearchStats:
+        """
+        Finds the shortest path of the map using jump points, and draws it on the map. \\
+        params:
+            - heuristic:
+                - the heuristic function to use. Must take in two cells, e.g. heuristic(cellA, cellB).
+                  Can also be the name of a built-in heuristic, see get_heuristic.
+            - heuristic_weight:
+                - a float value specifying how much to weight the heuristic (compared to the cell cost)
+            - stats:
+                - the SearchStats to fill in, see AStar.find_shortest_path. Jumping counts as neighbor generation.
+        returns:
+            - the SearchStats of the search.
+        """
+        stats = stats or SearchStats()
+        stats.begin('jps')
+        heuristic = stats.timed(get_heuristic(heuristic, self.map), 'heuristic')
+        successors = stats.timed(self._successors, 'neighbors')
+        frontier = stats.timed_frontier(self.frontier)
+        pushes = reopened = peak = 0
+        sample_every = stats.sample_every
+        g, parent, stamp = self.state.g, self.state.parent, self.state.stamp
+        reached = self.state.generation
+        start = self.start[0]*self.width + self.start[1]
+        self.direction[start] = None
+
+        while not frontier.empty():
+            # Update goal for task 5
+            self.map.tick()
+            self.stop = self.map.get_goal_pos()
+
+            if len(frontier) > peak:
+                peak = len(frontier)
+            current = frontier.pop()[1]
+            stamp[current] = reached + 1
+            self.expanded += 1
+            if sample_every and self.expanded % sample_every == 0:
+                stats.sample(self.expanded, len(frontier))
+            r, c = divmod(current, self.width)
+
+            if r == self.stop[0] and c == self.stop[1]:
+                print("Goal found!")
+                break
+
+            for jump_point, steps in successors(r, c, self.direction[current]):
+                neighbor = jump_point[0]*self.width + jump_point[1]
+                new_cost = g[current] + steps*self.grid[jump_point[0]][jump_point[1]]
+
+                if stamp[neighbor] < reached or new_cost < g[neighbor]:
+                    if self.headless:
+                        self.explored[neighbor] = EXPLORED
+                    else:
+                        self.map.str_map[jump_point] = ' - '
+
+                    if stamp[neighbor] == reached + 1:
+                        reopened += 1
+                    g[neighbor] = new_cost
+                    parent[neighbor] = current
+                    stamp[neighbor] = reached
+                    # Ordinary expansion for stop cells, otherwise keep going the way we came
+                    if self.stops[jump_point[0]][jump_point[1]]:
+                        self.direction[neighbor] = None
+                    else:
+                        self.direction[neighbor] = (np.sign(jump_point[0] - r), np.sign(jump_point[1] - c))
+
+                    prio = new_cost + heuristic(jump_point, self.stop)*heuristic_weight
+                    frontier.push(neighbor, prio)
+                    pushes += 1
+
+        stats.pushes, stats.reopened, stats.peak_frontier = pushes, reopened, peak
+        stats.end(self.expanded, self.state.cost(self.stop[0]*self.width + self.stop[1]))
+        self._fill_parents()
+        self._paint_path()
+        return stats
+
+    def _fill_parents(self):
+        """Sets the parent of every cell between two jump points on the path to the goal, so it can be painted."""
+        jump_points = self.state.path(self.stop[0]*self.width + self.stop[1]).tolist()
+        parent = self.state.parent
+        for current, jump_parent in zip(jump_points[:0:-1], jump_points[-2::-1]):
+            (r, c), (pr, pc) = divmod(current, self.width), divmod(jump_parent, self.width)
+            dr, dc = np.sign(pr - r), np.sign(pc - c)
+            # Step back towards the jump parent one cell at a time
+            while (r, c) != (pr, pc):
+                parent[r*self.width + c] = (r + dr)*self.width + c + dc
+                r, c = r + dr, c + dc
+
+    def _passable(self, r: int, c: int) -> bool:
+        return 0 <= r < self.height and 0 <= c < self.width and self.grid[r][c] != -1
+
+    def _successors(self, r: int, c: int, direction: tuple) -> list[tuple[tuple[int, int], int]]:
+        """Returns the jump points reachable from (r, c) as ((row, col), number of steps)."""
+        if direction is None:
+            # Ordinary expansion: every valid neighbor
+            if self.connectivity == 4:
+                neighbors = self.map.get_cell_neighbors([r, c])
+            else:
+                neighbors = self.map.get_cell_neighbors_8([r, c])
+            return [((n[0], n[1]), 1) for n in neighbors]
+
+        successors = []
+        for dr, dc in self._pruned_directions(r, c, *direction):
+            jump_point = self._jump(r, c, dr, dc)
+            if jump_point is not None:
+                successors.append(jump_point)
+        return successors
+
+    def _pruned_directions(self, r: int, c: int, dr: int, dc: int) -> list[tuple[int, int]]:
+        """The natural and forced directions to search from (r, c) when it was reached moving in (dr, dc)."""
+        passable = self._passable
+        if self.connectivity == 4:
+            if dc:
+                # Horizontal: go on, or turn up or down
+                return [(0, dc), (-1, 0), (1, 0)]
+            # Vertical: go on, or turn sideways if the cell behind that side is blocked
+            directions = [(dr, 0)]
+            for side in (-1, 1):
+                if passable(r, c + side) and not passable(r - dr, c + side):
+                    directions.append((0, side))
+            return directions
+
+        if dr and dc:
+            # Diagonal: go on, or along either component
+            directions = [(dr, dc), (dr, 0), (0, dc)]
+            if not passable(r, c - dc) and passable(r + dr, c - dc):
+                directions.append((dr, -dc))
+            if not passable(r - dr, c) and passable(r - dr, c + dc):
+                directions.append((-dr, dc))
+            return directions
+        if dc:
+            directions = [(0, dc)]
+            for side in (-1, 1):
+                if not passable(r + side, c) and passable(r + side, c + dc):
+                    directions.append((side, dc))
+            return directions
+        directions = [(dr, 0)]
+        for side in (-1, 1):
+            if not passable(r, c + side) and passable(r + dr, c + side):
+                directions.append((dr, side))
+        return directions
+
+    def _jump(self, r: int, c: int, dr: int, dc: int) -> tuple[tuple[int, int], int]:
+        """
+        Moves from (r, c) in direction (dr, dc) until reaching a jump point. \\
+        returns:
+            - ((row, col), steps) of the jump point, or None if a wall or the edge of the map is hit first.
+        """
+        passable, stops = self._passable, self.stops
+        steps = 0
+        while True:
+            r, c = r + dr, c + dc
+            steps += 1
+            if not passable(r, c):
+                return None
+            if stops[r][c]:
+                return (r, c), steps
+
+            if self.connectivity == 4:
+                if dc:
+                    # Any vertical jump point makes this a jump point
+                    if self._jump(r, c, -1, 0) or self._jump(r, c, 1, 0):
+                        return (r, c), steps
+                elif ((passable(r, c - 1) and not passable(r - dr, c - 1))
+                      or (passable(r, c + 1) and not passable(r - dr, c + 1))):
+                    return (r, c), steps
+            elif dr and dc:
+                if ((not passable(r, c - dc) and passable(r + dr, c - dc))
+                        or (not passable(r - dr, c) and passable(r - dr, c + dc))):
+                    return (r, c), steps
+                # Any straight jump point makes this a jump point
+                if self._jump(r, c, dr, 0) or self._jump(r, c, 0, dc):
+                    return (r, c), steps
+            elif dc:
+                if ((not passable(r - 1, c) and passable(r - 1, c + dc))
+                        or (not passable(r + 1, c) and passable(r + 1, c + dc))):
+                    return (r, c), steps
+            elif ((not passable(r, c - 1) and passable(r + dr, c - 1))
+                  or (not passable(r, c + 1) and passable(r + dr, c + 1))):
+                return (r, c), steps
+
+
+if __name__ == "__main__":
+    import contextlib
+    import io
+    import time
+
+    # Benchmark: expanded cells of JPS compared to the ordinary A*-loop
+    print(f"{'task':>4} {'conn':>4} | {'A* expanded':>11} {'JPS expanded':>12} {'reduction':>9} | "
+          f"{'A* ms':>7} {'JPS ms':>7} | {'cost':>5}")
+    for connectivity in (4, 8):
+        for task in range(1, 6):
+            results = []
+            for engine in (AStar, JumpPointSearch):
+                search = engine(Map_Obj(task=task), connectivity)
+                t0 = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    search.find_shortest_path('euclidean')
+                ms = (time.perf_counter() - t0)*1000
+                results.append((search.expanded, ms, search.cost[search.stop[0], search.stop[1]]))
+            (a_exp, a_ms, a_cost), (j_exp, j_ms, j_cost) = results
+            print(f"{task:>4} {connectivity:>4} | {a_exp:>11} {j_exp:>12} {1 - j_exp/a_exp:>9.0%} | "
+                  f"{a_ms:>7.1f} {j_ms:>7.1f} | {j_cost:>5.0f}" + ("" if a_cost == j_cost else f" (A*: {a_cost:.0f})"))
@@ -0,0 +1,126 @@
+from Map import Map_Obj
+from fields import dijkstra
+import os
+import numpy as np
+
+
+class Landmarks:
+    def __init__(self, map: Map_Obj, count: int = 8, connectivity: int = 4, cache_dir: str = None) -> None:
+        """
+        Initializes the landmark (ALT) heuristic for a map. \\
+        A few landmark cells are picked far apart from each other, and the exact cost from and to every landmark
+        is computed for all cells. By the triangle inequality, these give a lower bound on the cost between any
+        two cells, which follows walls and expensive terrain much more closely than a straight-line distance. \\
+        params:
+            - map:
+                - the Map_Obj to compute the landmarks of. Changes to the map after this are not seen.
+            - count:
+                - the number of landmarks.
+            - connectivity:
+                - 4 or 8, the connectivity of the searches the heuristic is used for.
+            - cache_dir:
+                - the directory to store the distance tables in, keyed by the content hash of the map.
+                  By default the directory of the map file (or the working directory). None of them are written
+                  if cache_dir is False.
+        """
+        self.map = map
+        self.connectivity = connectivity
+        self.shape = map.int_map.shape
+
+        self.cache_path = None
+        if cache_dir is not False:
+            if cache_dir is None:
+                cache_dir = os.path.dirname(map.path_to_map or '')
+            name = f"landmarks_{map.get_map_hash()}_{count}x{connectivity}.npz"
+            self.cache_path = os.path.join(cache_dir, name)
+
+        if self.cache_path is not None and os.path.exists(self.cache_path):
+            data = np.load(self.cache_path)
+            self.landmarks, self.dist_from, self.dist_to = data['landmarks'], data['dist_from'], data['dist_to']
+        else:
+            self._select(count)
+            if self.cache_path is not None:
+                np.savez_compressed(self.cache_path, landmarks=self.landmarks,
+                                    dist_from=self.dist_from, dist_to=self.dist_to)
+
+        # Heuristic grid of the last goal, as nested lists for fast lookups
+        self._goal = None
+        self._grid = None
+
+    def heuristic(self, a, b) -> float:
+        """
+        The landmark heuristic, a lower bound on the cost from cell a to cell b. Takes the same arguments as the
+        other heuristics, e.g. astar.find_shortest_path(landmarks.heuristic). The bounds towards a goal are
+        computed for all cells at once (see heuristic_grid) the first time that goal is seen.
+        """
+        if self._goal != (b[0], b[1]):
+            self._goal = (b[0], b[1])
+            self._grid = self.heuristic_grid(b).tolist()
+        return self._grid[a[0]][a[1]]
+
+    def heuristic_grid(self, goal) -> np.ndarray:
+        """
+        Computes the heuristic from every cell to `goal` at once. \\
+        returns:
+            - a float32 array with the shape of the map.
+        """
+        goal = goal[0]*self.shape[1] + goal[1]
+        with np.errstate(invalid='ignore'):
+            # d(v, t) >= d(L, t) - d(L, v)  and  d(v, t) >= d(v, L) - d(t, L)
+            forward = self.dist_from[:, goal][:, None] - self.dist_from
+            backward = self.dist_to - self.dist_to[:, goal][:, None]
+            bound = np.maximum(forward, backward).max(axis=0)
+        # Cells that are not connected to the landmarks get no bound
+        bound[~np.isfinite(bound)] = 0
+        return np.maximum(bound, 0).reshape(self.shape)
+
+    def _select(self, count: int):
+        """Picks landmarks by farthest-point selection and computes their distance tables."""
+        open_cells = np.flatnonzero(self.map.int_map.ravel() != -1)
+        landmarks, dist_from, dist_to = [], [], []
+
+        # Start from the cell farthest from an arbitrary open cell
+        nearest = self._dijkstra(int(open_cells[0]), reverse=False)
+        for _ in range(min(count, len(open_cells))):
+            reachable = np.where(np.isfinite(nearest), nearest, -1)
+            landmark = int(np.argmax(reachable))
+            landmarks.append(landmark)
+            dist_from.append(self._dijkstra(landmark, reverse=False))
+            dist_to.append(self._dijkstra(landmark, reverse=True))
+            # Next landmark: the cell farthest from all landmarks so far
+            nearest = dist_from[-1] if len(landmarks) == 1 else np.minimum(nearest, dist_from[-1])
+
+        self.landmarks = np.array(landmarks, dtype=np.int32)
+        self.dist_from = np.array(dist_from, dtype=np.float32)
+        self.dist_to = np.array(dist_to, dtype=np.float32)
+
+    def _dijkstra(self, source: int, reverse: bool) -> np.ndarray:
+        """
+        Computes the cost from `source` to all cells, or from all cells to `source` if reverse is True
+        (moving costs the value of the cell moved into, so the two differ).
+        """
+        cell = divmod(source, self.map.int_map.shape[1])
+        return dijkstra(self.map, cell, self.connectivity, reverse)[0].ravel()
+
+
+if __name__ == "__main__":
+    import contextlib
+    import io
+    import random
+    from a_star import AStar
+
+    # Expanded cells with the Euclidean heuristic compared to the landmark heuristic, on random queries
+    map = Map_Obj(task=4)
+    landmarks = Landmarks(map, cache_dir=False)
+    cells = np.argwhere(map.int_map != -1).tolist()
+    random.seed(0)
+    expanded = {'euclidean': 0, 'landmarks': 0}
+    for _ in range(100):
+        start, goal = random.choice(cells), random.choice(cells)
+        for name, h in (('euclidean', 'euclidean'), ('landmarks', landmarks.heuristic)):
+            query = Map_Obj.from_array(map.int_map, start, goal)
+            search = AStar(query, headless=True)
+            with contextlib.redirect_stdout(io.StringIO()):
+                search.find_shortest_path(h, use_graph=True)
+            expanded[name] += search.expanded
+    print(f"Expanded cells over 100 queries: {expanded}")
@@ -1,5 +1,4 @@
 from Map import Map_Obj
-import numpy as np
 from a_star import AStar
 
 # Changes in Map.py
@@ -10,16 +9,12 @@ from a_star import AStar
 #   - _filter_cells(self, cells: list) -> list[tuple[int, int]]
 # - Added function get_map_image() that returns the image-obj instead of showing it
 
-# Heuristic functions
-def heuristic(a, b):
-    return np.sqrt((b[0]-a[0])**2 + (b[1]-a[1])**2)
-
-def heuristic_moving(a, b):
-    return np.sqrt((b[0]-a[0]-0.25)**2 + (b[1]-a[1])**2)
-
+# Heuristics are passed by name (see a_star.HEURISTICS), or as a function of two cells
 astar = AStar(Map_Obj(task = 1))
-astar.find_shortest_path(heuristic, 1.0)
-# astar.find_shortest_path(heuristic_moving, 1.0) # uncomment to use this instead
+astar.find_shortest_path('euclidean', 1.0)
+# astar.find_shortest_path('manhattan', 1.0) # uncomment to use this instead
+# from landmarks import Landmarks
+# astar.find_shortest_path(Landmarks(astar.map).heuristic, 1.0) # or this, for the landmark (ALT) heuristic
 astar.show_path()
 
 
@@ -0,0 +1,182 @@
+from itertools import islice
+from typing import Iterable, Iterator
+import os
+import struct
+import numpy as np
+
+# Binary map format (.smap):
+#   header: magic b'SMAP', format version, height, width (four little-endian uint32 fields, 16 bytes)
+#   body:   height * width int8 cell values (-1 for walls, costs 1-4), row by row
+MAGIC = b'SMAP'
+VERSION = 1
+HEADER = struct.Struct('<4sIII')
+EXTENSION = '.smap'
+
+
+def binary_path(path: str) -> str:
+    """Returns the path of the binary map belonging to a (CSV) map file, e.g. 'map.csv' -> 'map.smap'."""
+    return os.path.splitext(path)[0] + EXTENSION
+
+
+def write_map(path: str, int_map: np.ndarray):
+    """
+    Writes an integer map to a binary map file. \\
+    params:
+        - path:
+            - the file to write.
+        - int_map:
+            - the map, a 2D array of cell values that fit in an int8.
+    """
+    if int_map.min() < -128 or int_map.max() > 127:
+        raise ValueError('map values must fit in an int8')
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, int_map.shape[0], int_map.shape[1]))
+        f.write(np.ascontiguousarray(int_map, dtype=np.int8).tobytes())
+
+
+def write_map_chunks(path: str, chunks: Iterable[np.ndarray]) -> tuple[int, int]:
+    """
+    Writes a map to a binary map file from chunks of rows, so the whole map never has to be in memory. \\
+    params:
+        - path:
+            - the file to write.
+        - chunks:
+            - 2D arrays of cell values (that fit in an int8), all with the same number of columns.
+    returns:
+        - the (height, width) of the written map.
+    """
+    height, width = 0, None
+    with open(path, 'wb') as f:
+        # The header is written last, when the height is known
+        f.write(bytes(HEADER.size))
+        for chunk in chunks:
+            if width is None:
+                width = chunk.shape[1]
+            elif chunk.shape[1] != width:
+                raise ValueError('all chunks of a map must have the same width')
+            if chunk.min() < -128 or chunk.max() > 127:
+                raise ValueError('map values must fit in an int8')
+            f.write(np.ascontiguousarray(chunk, dtype=np.int8).tobytes())
+            height += chunk.shape[0]
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, VERSION, height, width or 0))
+    return height, width or 0
+
+
+def read_header(path: str) -> tuple[int, int]:
+    """Reads the header of a binary map file and returns the (height, width) of the map."""
+    with open(path, 'rb') as f:
+        magic, version, height, width = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC:
+        raise ValueError(path + ' is not a binary map file')
+    if version != VERSION:
+        raise ValueError(path + ' has unsupported format version ' + str(version))
+    return height, width
+
+
+def load_map(path: str, mode: str = 'c') -> np.memmap:
+    """
+    Maps a binary map file into memory, without reading it. \\
+    params:
+        - path:
+            - the binary map file.
+        - mode:
+            - the np.memmap mode. The default 'c' (copy-on-write) lets processes share the pages of the file,
+              while changes to the map (e.g. the moving goal of task 5) stay private and never reach the file.
+    """
+    height, width = read_header(path)
+    return np.memmap(path, dtype=np.int8, mode=mode, offset=HEADER.size, shape=(height, width))
+
+
+def read_csv_chunks(path: str, chunk_rows: int = 1024) -> Iterator[np.ndarray]:
+    """
+    Reads a CSV map a number of rows at a time, so only one chunk is in memory at once. \\
+    params:
+        - path:
+            - the CSV map file, with one row of comma separated cell values per line.
+        - chunk_rows:
+            - the number of rows per chunk.
+    returns:
+        - a generator of int64 arrays of shape (rows, width). The values are checked to fit in an int8, so the
+          map can also be stored as a binary map, but kept wide so sums of costs can not overflow.
+    """
+    width = None
+    with open(path) as f:
+        while True:
+            lines = [line for line in islice(f, chunk_rows) if line.strip()]
+            if not lines:
+                return
+            try:
+                values = np.loadtxt(lines, dtype=np.int32, delimiter=',', ndmin=2)
+            except ValueError as error:
+                raise ValueError(path + ' is not a CSV map: ' + str(error)) from error
+            if width is None:
+                width = values.shape[1]
+            if values.shape[1] != width:
+                raise ValueError(path + ' is not a CSV map: its rows have different lengths')
+            # The same check as write_map, so values out of range are reported before a map is converted
+            if values.min() < -128 or values.max() > 127:
+                raise ValueError(path + ' has cell values that do not fit in an int8')
+            yield values.astype(np.int64)
+
+
+def read_csv(path: str, chunk_rows: int = 1024) -> np.ndarray:
+    """Reads a CSV map into an int64 array, a chunk of rows at a time (see read_csv_chunks)."""
+    chunks = list(read_csv_chunks(path, chunk_rows))
+    if not chunks:
+        raise ValueError(path + ' is an empty map')
+    return np.concatenate(chunks)
+
+
+def write_csv(path: str, chunks: Iterable[np.ndarray]):
+    """
+    Writes a map to a CSV file (the format of the Samfundet maps) from chunks of rows. \\
+    params:
+        - path:
+            - the file to write.
+        - chunks:
+            - 2D arrays of cell values from -9 to 9, e.g. a whole map as [int_map].
+    """
+    with open(path, 'wb') as f:
+        for chunk in chunks:
+            f.write(_csv_bytes(chunk))
+
+
+def _csv_bytes(chunk: np.ndarray) -> bytes:
+    """Formats rows of single digit cell values as CSV lines, without a Python loop over the cells."""
+    chunk = np.asarray(chunk, dtype=np.int8)
+    values = chunk.ravel()
+    if values.size and (values.min() < -9 or values.max() > 9):
+        raise ValueError('only cell values from -9 to 9 can be written as CSV')
+    negative = values < 0
+    # Every cell is its digit (with a minus if negative) and a comma, or a newline at the end of a row
+    lengths = 2 + negative
+    ends = np.cumsum(lengths)
+    text = np.empty(int(ends[-1]) if values.size else 0, dtype=np.uint8)
+    text[ends - lengths] = ord('-')
+    text[ends - 2] = ord('0') + np.abs(values)
+    separators = np.full(values.size, ord(','), dtype=np.uint8)
+    separators[chunk.shape[1] - 1::chunk.shape[1]] = ord('\n')
+    text[ends - 1] = separators
+    return text.tobytes()
+
+
+def convert_csv(csv_path: str, out_path: str = None, chunk_rows: int = 1024) -> str:
+    """
+    Converts a CSV map to a binary map file, by default next to it, reading a chunk of rows at a time. \\
+    returns:
+        - the path of the binary map.
+    """
+    out_path = out_path or binary_path(csv_path)
+    write_map_chunks(out_path, read_csv_chunks(csv_path, chunk_rows))
+    return out_path
+
+
+if __name__ == "__main__":
+    import sys
+
+    # Convert the given CSV maps, or all the Samfundet maps
+    paths = sys.argv[1:] or ['Samfundet_map_1.csv', 'Samfundet_map_2.csv', 'Samfundet_map_Edgar_full.csv']
+    for csv_path in paths:
+        out_path = convert_csv(csv_path)
+        print(f"{csv_path} ({os.path.getsize(csv_path)} bytes) -> {out_path} ({os.path.getsize(out_path)} bytes)")
@@ -0,0 +1,141 @@
+from typing import Iterator
+import numpy as np
+import map_format
+
+# Cells generated per chunk, which bounds the memory of generating (and writing) a map of any size
+CHUNK_CELLS = 2**20
+
+
+def generate_chunks(height: int, width: int, seed: int = 0, wall_fraction: float = 0.25,
+                    feature_size: int = 32, chunk_rows: int = None) -> Iterator[np.ndarray]:
+    """
+    Generates a procedural map with the cell values of the Samfundet maps (-1 for walls, costs 1-4), a chunk of rows
+    at a time. \\
+    Walls are blobs of smooth noise with a wall border around the map, and the costs of the open cells follow a
+    second noise, so cheap and expensive areas form regions like crowds. The noise is a hash of the position and
+    the seed, so a map is the same for a seed on every machine, whatever the chunk size. \\
+    params:
+        - height, width:
+            - the size of the map in cells.
+        - seed:
+            - the seed of the map.
+        - wall_fraction:
+            - the (approximate) fraction of cells inside the border that are walls.
+        - feature_size:
+            - the size in cells of the wall blobs and cost regions.
+        - chunk_rows:
+            - the number of rows per chunk, by default as many as fit in CHUNK_CELLS cells.
+    returns:
+        - a generator of int8 arrays of shape (rows, width), from the top of the map down.
+    """
+    if height < 3 or width < 3:
+        raise ValueError('a map must be at least 3x3 cells')
+    chunk_rows = chunk_rows or max(1, CHUNK_CELLS // width)
+    # The noise is not uniform, so the wall threshold is taken from a sample of it
+    sample = np.arange(512)*3
+    wall_threshold = np.quantile(_noise(sample, sample, seed, 1, feature_size), 1 - wall_fraction)
+    for top in range(0, height, chunk_rows):
+        rows = np.arange(top, min(top + chunk_rows, height))
+        cols = np.arange(width)
+        walls = _noise(rows, cols, seed, 1, feature_size) > wall_threshold
+        costs = _noise(rows, cols, seed, 2, feature_size*2)
+        chunk = np.clip((costs*4).astype(np.int8) + 1, 1, 4)
+        chunk[walls] = -1
+        # The border is always a wall
+        chunk[:, [0, -1]] = -1
+        if top == 0:
+            chunk[0] = -1
+        if rows[-1] == height - 1:
+            chunk[-1] = -1
+        yield chunk
+
+
+def generate_map(height: int, width: int, seed: int = 0, wall_fraction: float = 0.25,
+                 feature_size: int = 32) -> np.ndarray:
+    """Generates a whole procedural map as an int8 array, see generate_chunks."""
+    return np.concatenate(list(generate_chunks(height, width, seed, wall_fraction, feature_size)))
+
+
+def write_generated(path: str, height: int, width: int, seed: int = 0, wall_fraction: float = 0.25,
+                    feature_size: int = 32):
+    """
+    Generates a procedural map (see generate_chunks) straight into a file, a chunk at a time. \\
+    params:
+        - path:
+            - the file to write: a CSV map if it ends in '.csv', otherwise a binary map (see map_format.py).
+    """
+    chunks = generate_chunks(height, width, seed, wall_fraction, feature_size)
+    if path.endswith('.csv'):
+        map_format.write_csv(path, chunks)
+    else:
+        map_format.write_map_chunks(path, chunks)
+
+
+def _noise(rows: np.ndarray, cols: np.ndarray, seed: int, layer: int, size: int) -> np.ndarray:
+    """
+    Smooth value noise in [0, 1) at the given rows and columns: random values on a lattice with `size` cells between
+    points, blended with smoothstep. Returns an array of shape (len(rows), len(cols)).
+    """
+    r, c = rows / size, cols / size
+    r0, c0 = np.floor(r).astype(np.int64), np.floor(c).astype(np.int64)
+    # Lattice values of the rows and columns touched, looked up for every cell
+    lattice_rows = np.arange(r0.min(), r0.max() + 2)
+    lattice_cols = np.arange(c0.min(), c0.max() + 2)
+    lattice = _hash(lattice_rows[:, None], lattice_cols[None, :], seed, layer)
+    i, j = (r0 - lattice_rows[0])[:, None], (c0 - lattice_cols[0])[None, :]
+    u, v = _smoothstep(r - r0)[:, None], _smoothstep(c - c0)[None, :]
+    top = lattice[i, j]*(1 - v) + lattice[i, j + 1]*v
+    bottom = lattice[i + 1, j]*(1 - v) + lattice[i + 1, j + 1]*v
+    return top*(1 - u) + bottom*u
+
+
+def _smoothstep(t: np.ndarray) -> np.ndarray:
+    return t*t*(3 - 2*t)
+
+
+def _hash(rows: np.ndarray, cols: np.ndarray, seed: int, layer: int) -> np.ndarray:
+    """A uniform value in [0, 1) for every (row, col) pair, from a splitmix64 style hash of the pair and the seed."""
+    x = rows.astype(np.uint64)*np.uint64(0x9E3779B97F4A7C15)
+    x = x ^ cols.astype(np.uint64)*np.uint64(0xC2B2AE3D27D4EB4F)
+    x ^= np.uint64((seed*0x165667B1 + layer*0x27D4EB2F) & 0xFFFFFFFFFFFFFFFF)
+    x ^= x >> np.uint64(30)
+    x *= np.uint64(0xBF58476D1CE4E5B9)
+    x ^= x >> np.uint64(27)
+    x *= np.uint64(0x94D049BB133111EB)
+    x ^= x >> np.uint64(31)
+    return (x >> np.uint64(11)).astype(np.float64) / 2.0**53
+
+
+if __name__ == "__main__":
+    import argparse
+    import os
+    import time
+    import tracemalloc
+
+    parser = argparse.ArgumentParser(description='Generate a large procedural map, and time reading it back.')
+    parser.add_argument('path', help="the file to write, a CSV map if it ends in '.csv', otherwise a binary map")
+    parser.add_argument('--height', type=int, default=4096)
+    parser.add_argument('--width', type=int, default=4096)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--walls', type=float, default=0.25, help='fraction of wall cells (default: 0.25)')
+    args = parser.parse_args()
+
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    write_generated(args.path, args.height, args.width, args.seed, args.walls)
+    written = time.perf_counter() - t0
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    size = os.path.getsize(args.path)
+    print(f"Wrote {args.height}x{args.width} cells ({size / 2**20:.1f} MiB) in {written:.1f} s, "
+          f"peak {peak / 2**20:.0f} MiB")
+
+    if args.path.endswith('.csv'):
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        cells = sum(chunk.size for chunk in map_format.read_csv_chunks(args.path))
+        read = time.perf_counter() - t0
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"Read {cells} cells back in {read:.1f} s ({cells / read / 1e6:.0f} M cells/s), "
+              f"peak {peak / 2**20:.0f} MiB")
@@ -0,0 +1,166 @@
+from Map import Map_Obj
+from a_star import AStar
+from collections import OrderedDict
+from typing import Callable, Union
+from math import inf
+import hashlib
+import os
+import time
+import numpy as np
+
+
+class RouteCache:
+    def __init__(self, map: Map_Obj, connectivity: int = 4, max_entries: int = 1024, ttl: float = None,
+                 cache_dir: str = None) -> None:
+        """
+        Initializes a cache of shortest paths on a map, in front of AStar.find_paths. A query that was answered
+        before is returned without searching. \\
+        Routes are kept in memory (the max_entries most recently used), and on disk if cache_dir is given, keyed by
+        the content hash of the map and the query, so the disk tier stays valid across runs on the same map. \\
+        Cell changes (set_cell_value/replace_map_values) only drop the routes they affect: a route stays valid when
+        a cell off its path gets more expensive (or a wall), or when a cell gets cheaper but no path through it
+        can be cheaper than the route. The map version (Map_Obj.get_map_version) tells when to hash the map again. \\
+        params:
+            - map:
+                - the Map_Obj to find paths on. The cache listens to its cell changes until detach() is called.
+            - connectivity:
+                - 4 or 8, whether to move only straight or also diagonally between cells.
+            - max_entries:
+                - the number of routes to keep in memory.
+            - ttl:
+                - seconds a route is kept (in memory and on disk) before it is searched again, by default forever.
+            - cache_dir:
+                - a directory to store the routes in, as 'route_{map hash}_{query hash}.npz'. Only routes of
+                  named heuristics (see get_heuristic) are stored.
+        """
+        self.map = map
+        self.connectivity = connectivity
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.cache_dir = cache_dir
+        self.width = map.int_map.shape[1]
+        self.search = AStar(map, connectivity, headless=True)
+
+        # (start, goal, heuristic, weight) -> [path, flat path, cost, time stored], least recently used first
+        self.entries = OrderedDict()
+        # A lower bound of the cost of every cell, to tell which routes a cheaper cell can improve
+        self.min_cost = int(map.int_map[map.int_map != -1].min())
+
+        self.hits = self.disk_hits = self.misses = self.invalidated = 0
+        map.add_change_listener(self._on_cell_changed)
+
+    def detach(self):
+        """Stops listening to changes of the map."""
+        self.map.remove_change_listener(self._on_cell_changed)
+
+    def clear(self):
+        """Drops all routes from memory (not from disk)."""
+        self.entries.clear()
+
+    def find_path(self, start: list[int], goal: list[int], heuristic: Union[str, Callable] = None,
+                  heuristic_weight: float = 1.0) -> np.ndarray:
+        """
+        Finds the shortest path from start to goal, from the cache if possible. \\
+        params:
+            - start, goal:
+                - the cells to find a path between.
+            - heuristic, heuristic_weight:
+                - the heuristic to search with, see AStar.find_paths. Part of the key of the route.
+        returns:
+            - the path as an int32 array of shape (n, 2) going from start to goal, empty (0, 2) if there is none.
+              The array is shared with the cache, and can not be changed.
+        """
+        key = (int(start[0]), int(start[1]), int(goal[0]), int(goal[1]), heuristic, heuristic_weight)
+        entry = self.entries.get(key)
+        if entry is not None and self._expired(entry[3]):
+            del self.entries[key]
+            entry = None
+        if entry is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+        file = self._file(key)
+        if file is not None and os.path.exists(file) and not self._expired(os.path.getmtime(file), time.time()):
+            path = np.load(file)['path']
+            self.disk_hits += 1
+        else:
+            path = self.search.find_paths([(start, goal)], heuristic, heuristic_weight)[0][0]
+            self.misses += 1
+            if file is not None:
+                np.savez(file, path=path)
+        self._store(key, path)
+        return path
+
+    def _store(self, key: tuple, path: np.ndarray):
+        path.setflags(write=False)
+        flat = path[:, 0]*self.width + path[:, 1]
+        cost = int(self.map.int_map[path[1:, 0], path[1:, 1]].sum()) if len(path) else inf
+        self.entries[key] = [path, flat, cost, time.monotonic()]
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def _expired(self, stored: float, now: float = None) -> bool:
+        return self.ttl is not None and (now if now is not None else time.monotonic()) - stored > self.ttl
+
+    def _file(self, key: tuple) -> str:
+        """The file of a route in the disk tier, or None if it has none."""
+        if self.cache_dir is None or not (key[4] is None or isinstance(key[4], str)):
+            return None
+        query = hashlib.sha1(repr((self.connectivity,) + key).encode()).hexdigest()[:16]
+        return os.path.join(self.cache_dir, f"route_{self.map.get_map_hash()}_{query}.npz")
+
+    def _on_cell_changed(self, pos: list[int], old_value: int, value: int):
+        """Drops the routes the changed cell affects."""
+        index = pos[0]*self.width + pos[1]
+        if value != -1:
+            self.min_cost = min(self.min_cost, value)
+        if self.connectivity == 4:
+            def steps(a, b):
+                return abs(a[0] - b[0]) + abs(a[1] - b[1])
+        else:
+            def steps(a, b):
+                return max(abs(a[0] - b[0]), abs(a[1] - b[1]))
+
+        for key, entry in list(self.entries.items()):
+            path, flat, cost = entry[:3]
+            if value == -1 or (old_value != -1 and value > old_value):
+                # More expensive: only a route through the cell changes (the start cell is free, but not as a wall)
+                affected = index in (flat if value == -1 else flat[1:])
+            elif not len(path):
+                # Cheaper: a missing route can only appear where a wall was removed
+                affected = old_value == -1
+            elif index in flat[1:]:
+                # Cheaper on the route: the route only gets cheaper too
+                entry[2] = cost + value - old_value
+                affected = False
+            else:
+                # Cheaper off the route: a path through the cell costs at least this much
+                start, goal = key[:2], key[2:4]
+                bound = (steps(start, pos) - 1)*self.min_cost + value + steps(pos, goal)*self.min_cost
+                affected = pos != list(start) and bound < cost
+            if affected:
+                del self.entries[key]
+                self.invalidated += 1
+
+
+if __name__ == "__main__":
+    import random
+
+    # Repeated queries on the Edgar map, with a cell change in between
+    map = Map_Obj(task=4)
+    cache = RouteCache(map)
+    open_cells = np.argwhere(map.int_map != -1).tolist()
+    rng = random.Random(4)
+    pairs = [(rng.choice(open_cells), rng.choice(open_cells)) for _ in range(50)]
+    queries = [rng.choice(pairs) for _ in range(1000)]
+
+    t0 = time.perf_counter()
+    for start, goal in queries:
+        cache.find_path(start, goal, 'manhattan')
+    print(f"{len(queries)} queries in {(time.perf_counter() - t0) * 1000:.0f} ms: "
+          f"{cache.hits} hits, {cache.misses} searches")
+
+    cell = pairs[0][1]
+    map.set_cell_value(cell, 4, str_map=False)
+    print(f"Changed {cell}: {cache.invalidated} of {cache.invalidated + len(cache.entries)} routes dropped")
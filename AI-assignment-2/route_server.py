@@ -0,0 +1,105 @@
+from Map import Map_Obj
+from a_star import AStar
+from multiprocessing import Pool, shared_memory
+from typing import Callable
+import os
+import numpy as np
+
+# State of a worker process, set up once by _init_worker
+_worker = {}
+
+
+def _init_worker(name: str, shape: tuple, dtype: str, connectivity: int, heuristic: Callable):
+    """Attaches a worker process to the shared map, and sets up its own search buffers."""
+    shm = shared_memory.SharedMemory(name=name)
+    grid = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    map = Map_Obj.from_array(grid, [0, 0], [0, 0])
+    _worker.update(shm=shm, search=AStar(map, connectivity), heuristic=heuristic)
+
+
+def _route(queries: list) -> list[np.ndarray]:
+    """Answers a chunk of (start, goal) queries in a worker process."""
+    return _worker['search'].find_paths(queries, _worker['heuristic'])[0]
+
+
+class RouteServer:
+    def __init__(self, map: Map_Obj, workers: int = None, connectivity: int = 4, heuristic: Callable = None) -> None:
+        """
+        Starts a pool of worker processes that answer shortest path queries on one map. \\
+        The map is copied once into shared memory, and every worker reads it from there (no CSV parsing per
+        process), while keeping its own search buffers. Requests and results go through
+        the local queues of the pool. Use as a context manager, or call close() when done. \\
+        params:
+            - map:
+                - the Map_Obj to route on. Later changes to it are not seen by the workers.
+            - workers:
+                - the number of worker processes, by default one per core.
+            - connectivity:
+                - 4 or 8, whether to move only straight or also diagonally between cells.
+            - heuristic:
+                - optional heuristic function, e.g. heuristic(cellA, cellB), or name (see get_heuristic).
+                  Functions must be defined at module level, so they can be sent to the workers.
+        """
+        grid = np.ascontiguousarray(map.int_map)
+        self.shm = shared_memory.SharedMemory(create=True, size=grid.nbytes)
+        np.ndarray(grid.shape, dtype=grid.dtype, buffer=self.shm.buf)[:] = grid
+
+        self.workers = workers or os.cpu_count()
+        self.pool = Pool(self.workers, initializer=_init_worker,
+                         initargs=(self.shm.name, grid.shape, grid.dtype.str, connectivity, heuristic))
+
+    def __enter__(self) -> 'RouteServer':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def find_path(self, start: list[int], goal: list[int]) -> np.ndarray:
+        """Returns the shortest path from start to goal as an int32 array of shape (n, 2), see AStar.find_paths."""
+        return self.pool.apply(_route, ([(start, goal)],))[0]
+
+    def find_paths(self, queries: list, chunksize: int = 64) -> list[np.ndarray]:
+        """
+        Answers many (start, goal) queries on all workers. \\
+        params:
+            - queries:
+                - a list of (start, goal) cell pairs.
+            - chunksize:
+                - the number of queries sent to a worker at a time. Queries are sorted by start first, so
+                  queries with the same start tend to share one search.
+        returns:
+            - a list with one path per query (in the same order), see AStar.find_paths.
+        """
+        order = sorted(range(len(queries)), key=lambda i: tuple(queries[i][0]))
+        chunks = [[queries[i] for i in order[j:j + chunksize]] for j in range(0, len(order), chunksize)]
+
+        paths = [None] * len(queries)
+        results = (path for chunk in self.pool.imap(_route, chunks) for path in chunk)
+        for i, path in zip(order, results):
+            paths[i] = path
+        return paths
+
+    def close(self):
+        """Stops the workers and frees the shared memory."""
+        self.pool.close()
+        self.pool.join()
+        self.shm.close()
+        self.shm.unlink()
+
+
+if __name__ == "__main__":
+    import random
+    import time
+
+    # Throughput with one worker compared to one worker per core
+    map = Map_Obj(task=4)
+    cells = np.argwhere(map.int_map != -1).tolist()
+    random.seed(0)
+    queries = [(random.choice(cells), random.choice(cells)) for _ in range(4000)]
+
+    for workers in sorted({1, os.cpu_count()}):
+        with RouteServer(map, workers, heuristic='manhattan') as server:
+            server.find_path(queries[0][0], queries[0][1])  # wait for the workers to start
+            t0 = time.perf_counter()
+            server.find_paths(queries)
+            print(f"{workers} worker(s): {len(queries) / (time.perf_counter() - t0):.0f} queries/s")
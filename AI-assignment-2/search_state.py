@@ -0,0 +1,127 @@
+from array import array
+import numpy as np
+
+
+class SparseArray(dict):
+    """A dictionary used in place of a flat array, where missing indices have a default value."""
+    def __init__(self, default) -> None:
+        super().__init__()
+        self.default = default
+
+    def __missing__(self, index: int):
+        return self.default
+
+
+class SearchState:
+    def __init__(self, size: int, cost_type: str = 'i', sparse: bool = False) -> None:
+        """
+        Initializes the per-cell state of a search: the cost found so far (g), the parent and whether the cell
+        was reached or closed, all in flat arrays indexed by the cell index (row*width + col). \\
+        Every cell takes 12 bytes (16 with float64 costs). The arrays are allocated once, and reset() starts a new search in O(1):
+        every cell carries the generation it was last reached in (its stamp), and values of older generations
+        are treated as unset. \\
+        params:
+            - size:
+                - the number of cells, e.g. the number of cells in the map.
+            - cost_type:
+                - 'i' for int32 costs (the cost of a path of cells), 'f' for float32 or 'd' for float64 costs.
+            - sparse:
+                - if True, keep the state in dictionaries (SparseArray) instead, so only the cells the search
+                  touches take memory. For maps too large to allocate a few bytes for every cell, see TiledMap.
+        """
+        self.size = size
+        self.cost_type = cost_type
+        self.sparse = sparse
+        if sparse:
+            self.g, self.parent, self.stamp = SparseArray(0), SparseArray(-1), SparseArray(0)
+        else:
+            self.g = array(cost_type, bytes(array(cost_type).itemsize*size))
+            self.parent = array('i', bytes(4*size))
+            # A cell is reached in this search if stamp == generation, and closed if stamp == generation + 1
+            self.stamp = array('I', bytes(4*size))
+        self.generation = 0
+        self.reset()
+
+    def reset(self):
+        """Forgets all cells, starting a new search."""
+        if self.sparse:
+            # Free the touched cells (keeping the same dictionaries)
+            self.g.clear()
+            self.parent.clear()
+            self.stamp.clear()
+        elif self.generation >= 0xFFFFFFFF - 2:
+            # The stamps would overflow: clear them once, and start counting again
+            self.stamp = array('I', bytes(4*self.size))
+            self.generation = 0
+        self.generation += 2
+
+    def reached(self, index: int) -> bool:
+        """Returns True if the cell has a cost in this search."""
+        return self.stamp[index] >= self.generation
+
+    def closed(self, index: int) -> bool:
+        """Returns True if the cell has been expanded (and not reopened) in this search."""
+        return self.stamp[index] == self.generation + 1
+
+    def open(self, index: int, g: float, parent: int = -1):
+        """Sets the cost and parent of a cell, and marks it reached (and not closed)."""
+        self.g[index] = g
+        self.parent[index] = parent
+        self.stamp[index] = self.generation
+
+    def close(self, index: int):
+        """Marks a reached cell as expanded."""
+        self.stamp[index] = self.generation + 1
+
+    def reopen_all(self):
+        """Marks every closed cell as reached but not closed again, keeping their costs and parents."""
+        if self.sparse:
+            for index, stamp in self.stamp.items():
+                if stamp == self.generation + 1:
+                    self.stamp[index] = self.generation
+            return
+        stamp = np.frombuffer(self.stamp, dtype=np.uint32)
+        stamp[stamp == self.generation + 1] = self.generation
+
+    def cost(self, index: int) -> float:
+        """Returns the cost of a cell, or -1 if it was not reached."""
+        return self.g[index] if self.stamp[index] >= self.generation else -1
+
+    def costs(self) -> np.ndarray:
+        """Returns the cost of every cell as a flat array, -1 for cells that were not reached."""
+        dtype = {'i': np.int32, 'f': np.float32, 'd': np.float64}[self.cost_type]
+        if self.sparse:
+            return self._dense(self.g, dtype)
+        return np.where(self._reached_mask(), np.frombuffer(self.g, dtype=dtype), -1)
+
+    def parents(self) -> np.ndarray:
+        """Returns the parent of every cell as a flat int32 array, -1 for the start and cells that were not reached."""
+        if self.sparse:
+            return self._dense(self.parent, np.int32)
+        return np.where(self._reached_mask(), np.frombuffer(self.parent, dtype=np.int32), -1).astype(np.int32)
+
+    def path(self, goal: int) -> np.ndarray:
+        """
+        Follows the parents from a cell back to the start of the search. \\
+        returns:
+            - the flat indices of the path from start to goal as an int32 array, empty if the goal was not reached.
+        """
+        if not self.reached(goal):
+            return np.zeros(0, dtype=np.int32)
+        parent = self.parent
+        path = array('i', [goal])
+        current = parent[goal]
+        while current != -1:
+            path.append(current)
+            current = parent[current]
+        return np.frombuffer(path, dtype=np.int32)[::-1].copy()
+
+    def _dense(self, values: SparseArray, dtype) -> np.ndarray:
+        """The values of the reached cells of a sparse state as a flat array, -1 for all other cells."""
+        dense = np.full(self.size, -1, dtype=dtype)
+        reached = [index for index, stamp in self.stamp.items() if stamp >= self.generation]
+        dense[reached] = [values[index] for index in reached]
+        return dense
+
+    def _reached_mask(self) -> np.ndarray:
+        return np.frombuffer(self.stamp, dtype=np.uint32) >= self.generation
@@ -0,0 +1,140 @@
+from typing import Callable
+import csv
+import json
+import time
+
+
+class SearchStats:
+    # Fields of one search, in the order of the CSV columns
+    FIELDS = ('algorithm', 'found', 'cost', 'expanded', 'pushes', 'reopened', 'peak_frontier',
+              'time_total', 'time_neighbors', 'time_heuristic', 'time_queue')
+
+    def __init__(self, timings: bool = False, sample_every: int = 0) -> None:
+        """
+        Initializes the statistics of a search, filled in by the search and returned from it. \\
+        Counts are always collected. The frontier is an indexed heap, so it never holds stale duplicates of a cell;
+        `reopened` counts the expanded cells that were put back in the frontier (which would be stale duplicate
+        pops with a plain heap). \\
+        params:
+            - timings:
+                - if True, also measure the time spent generating neighbors, evaluating the heuristic and in the
+                  frontier. This slows the search down, and is off by default.
+            - sample_every:
+                - if above 0, record (expanded, frontier size, seconds) every sample_every expansions in `samples`.
+        """
+        self.timings = timings
+        self.sample_every = sample_every
+
+        self.algorithm = ''
+        self.found = False
+        self.cost = -1
+        self.expanded = 0
+        self.pushes = 0
+        self.reopened = 0
+        self.peak_frontier = 0
+        self.time_total = 0.0
+        self.time_neighbors = 0.0
+        self.time_heuristic = 0.0
+        self.time_queue = 0.0
+        self.samples = []
+
+        self._t0 = None
+
+    def begin(self, algorithm: str):
+        """Called by the search when it starts."""
+        self.algorithm = algorithm
+        self._t0 = time.perf_counter()
+
+    def end(self, expanded: int, cost: float):
+        """Called by the search when it is done, with the number of expanded cells and the cost of the path (-1 if none)."""
+        self.time_total = time.perf_counter() - self._t0
+        self.expanded = expanded
+        self.cost = cost
+        self.found = cost != -1
+
+    def sample(self, expanded: int, frontier_size: int):
+        """Records the size of the frontier after a number of expansions."""
+        self.samples.append((expanded, frontier_size, time.perf_counter() - self._t0))
+
+    def timed(self, function: Callable, field: str) -> Callable:
+        """Returns the function, adding the time spent in it to the field 'time_<field>' if timings are on."""
+        if not self.timings:
+            return function
+        name = 'time_' + field
+
+        def timed_function(*args):
+            t0 = time.perf_counter()
+            result = function(*args)
+            setattr(self, name, getattr(self, name) + time.perf_counter() - t0)
+            return result
+        return timed_function
+
+    def timed_frontier(self, frontier):
+        """Returns the frontier, adding the time spent in push and pop to time_queue if timings are on."""
+        if not self.timings:
+            return frontier
+        return _TimedFrontier(frontier, self)
+
+    def to_dict(self) -> dict:
+        """Returns the fields (and samples) as a dictionary."""
+        stats = {field: getattr(self, field) for field in self.FIELDS}
+        stats['samples'] = [list(sample) for sample in self.samples]
+        return stats
+
+    def to_json(self, file: str = None) -> str:
+        """Returns the fields (and samples) as JSON, and writes them to file if given."""
+        text = json.dumps(self.to_dict(), indent=2)
+        if file is not None:
+            with open(file, 'w') as f:
+                f.write(text)
+        return text
+
+    def to_csv(self, file: str):
+        """Writes the fields as one CSV row to file, see write_csv."""
+        write_csv([self], file)
+
+    def __repr__(self) -> str:
+        return 'SearchStats(' + ', '.join(f"{field}={getattr(self, field)!r}" for field in self.FIELDS) + ')'
+
+
+def write_csv(stats: list[SearchStats], file: str, append: bool = False):
+    """
+    Writes the fields of many searches to a CSV file, one row per search (samples are left out). \\
+    params:
+        - stats:
+            - the SearchStats to write.
+        - file:
+            - the path of the CSV file.
+        - append:
+            - if True, add the rows to the end of an existing file instead of overwriting it (without a new header).
+    """
+    with open(file, 'a' if append else 'w', newline='') as f:
+        writer = csv.writer(f)
+        if not append or f.tell() == 0:
+            writer.writerow(SearchStats.FIELDS)
+        for search in stats:
+            writer.writerow([getattr(search, field) for field in SearchStats.FIELDS])
+
+
+class _TimedFrontier:
+    """Wraps a frontier, adding the time spent in push and pop to the time_queue of the stats."""
+    def __init__(self, frontier, stats: SearchStats) -> None:
+        self.frontier = frontier
+        self.stats = stats
+
+    def __len__(self) -> int:
+        return len(self.frontier)
+
+    def __getattr__(self, name: str):
+        return getattr(self.frontier, name)
+
+    def push(self, index: int, prio: float):
+        t0 = time.perf_counter()
+        self.frontier.push(index, prio)
+        self.stats.time_queue += time.perf_counter() - t0
+
+    def pop(self) -> tuple[float, int]:
+        t0 = time.perf_counter()
+        item = self.frontier.pop()
+        self.stats.time_queue += time.perf_counter() - t0
+        return item
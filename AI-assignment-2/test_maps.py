@@ -0,0 +1,76 @@
+from Map import Map_Obj
+from a_star import AStar
+from any_angle import ThetaStar
+from tiled_map import TiledMap
+from route_cache import RouteCache
+import map_format
+import contextlib
+import io
+import numpy as np
+import pytest
+
+
+def _cost(map: Map_Obj, path: np.ndarray) -> int:
+    return int(map.int_map[path[1:, 0], path[1:, 1]].sum())
+
+
+def test_route_cache_on_int8_map_with_long_routes():
+    # Routes across a 300x300 map cost far more than an int8 holds, while the cell values are int8
+    grid = np.full((300, 300), 2, dtype=np.int8)
+    map = Map_Obj.from_array(grid, [0, 0], [299, 299])
+    cache = RouteCache(map)
+    queries = [([0, 0], [299, 299]), ([0, 299], [299, 0]), ([150, 0], [150, 299])]
+    for start, goal in queries:
+        cache.find_path(start, goal)
+
+    # Cheaper off the routes, cheaper on a route, and more expensive on a route
+    map.set_cell_value([10, 200], 1, str_map=False)
+    map.set_cell_value([150, 150], 1, str_map=False)
+    map.set_cell_value([0, 1], 4, str_map=False)
+    assert isinstance(cache.min_cost, int)
+
+    fresh = AStar(map, headless=True)
+    for start, goal in queries:
+        path = cache.find_path(start, goal)
+        assert _cost(map, path) == _cost(map, fresh.find_paths([(start, goal)])[0][0])
+
+
+def test_csv_maps_are_read_wide(tmp_path):
+    grid = np.full((4, 200), 3, dtype=np.int64)
+    grid[1, 1:-1] = -1
+    path = str(tmp_path / 'map.csv')
+    map_format.write_csv(path, [grid])
+
+    int_map = map_format.read_csv(path, chunk_rows=3)
+    assert int_map.dtype == np.int64 and (int_map == grid).all()
+
+    # The binary map of it is int8 on disk, with the same values
+    binary = map_format.convert_csv(path)
+    assert map_format.load_map(binary).dtype == np.int8
+    assert (map_format.load_map(binary) == grid).all()
+
+
+def test_csv_values_out_of_range(tmp_path):
+    path = tmp_path / 'map.csv'
+    path.write_text('1,2\n3,200\n')
+    with pytest.raises(ValueError):
+        map_format.read_csv(str(path))
+
+
+def test_theta_star_on_tiled_map(tmp_path):
+    # Cheapest cells cost 2, so the default heuristic is scaled, which needs the minimum without the whole map
+    grid = np.full((60, 80), 3, dtype=np.int8)
+    grid[::7, :] = 2
+    grid[10:50, 40] = -1
+    path = str(tmp_path / ('map' + map_format.EXTENSION))
+    map_format.write_map(path, grid)
+    tiled = TiledMap(path, np.array([5, 5]), np.array([55, 75]), tile_size=16, max_tiles=4)
+    assert tiled.get_min_cost() == 2
+
+    results = []
+    for map in (tiled, Map_Obj.from_array(grid.copy(), [5, 5], [55, 75])):
+        search = ThetaStar(map, headless=True)
+        with contextlib.redirect_stdout(io.StringIO()):
+            stats = search.find_shortest_path()
+        results.append((stats.cost, search.path.tolist()))
+    assert results[0] == results[1] and results[0][0] > 0
@@ -0,0 +1,184 @@
+from Map import Map_Obj
+from collections import OrderedDict
+import os
+import numpy as np
+import map_format
+
+
+class TiledGrid:
+    def __init__(self, path: str, tile_size: int = 256, max_tiles: int = 64) -> None:
+        """
+        Initializes a grid of cell values that is read from a binary map file (see map_format.py) in square tiles,
+        only when a cell of a tile is used. At most max_tiles tiles are kept in memory, dropping the least
+        recently used one. Cells are read and written like in a 2D array, e.g. grid[row, col]. \\
+        Changed cells are never written to the file: tiles with changes are kept in memory (and not counted in
+        max_tiles), like the copy-on-write maps of map_format.load_map. \\
+        params:
+            - path:
+                - the binary map file.
+            - tile_size:
+                - the number of rows and columns of a tile.
+            - max_tiles:
+                - the number of unchanged tiles to keep in memory.
+        """
+        self.path = path
+        self.file = map_format.load_map(path, mode='r')
+        self.shape = self.file.shape
+        self.size = self.shape[0] * self.shape[1]
+        self.ndim = 2
+        self.dtype = self.file.dtype
+        self.tile_size = tile_size
+        self.max_tiles = max_tiles
+
+        # Unchanged tiles, least recently used first, and tiles with changed cells
+        self.tiles = OrderedDict()
+        self.changed_tiles = {}
+        # Number of tiles read from the file
+        self.loads = 0
+        # The last tile used, which most lookups hit again
+        self._last_key = None
+        self._last_tile = None
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    def __getitem__(self, pos):
+        if isinstance(pos, tuple):
+            row, col = pos
+            tile = self._tile(row // self.tile_size, col // self.tile_size)
+            return int(tile[row % self.tile_size, col % self.tile_size])
+        # grid[row] is a row, so grid[row][col] works too
+        return _Row(self, pos)
+
+    def __setitem__(self, pos: tuple[int, int], value: int):
+        row, col = pos
+        key = (row // self.tile_size, col // self.tile_size)
+        if key not in self.changed_tiles:
+            self._tile(*key)
+            self.changed_tiles[key] = self.tiles.pop(key)
+            self._last_key = None
+        self.changed_tiles[key][row % self.tile_size, col % self.tile_size] = value
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        return self.window(0, self.shape[0], 0, self.shape[1]).astype(dtype or self.dtype, copy=False)
+
+    def window(self, top: int, bottom: int, left: int, right: int) -> np.ndarray:
+        """Returns a copy of the cells in rows top:bottom and columns left:right (with changes), without caching tiles."""
+        window = np.array(self.file[top:bottom, left:right])
+        size = self.tile_size
+        for (tile_row, tile_col), tile in self.changed_tiles.items():
+            r0, c0 = tile_row*size, tile_col*size
+            rows = slice(max(r0, top), min(r0 + tile.shape[0], bottom))
+            cols = slice(max(c0, left), min(c0 + tile.shape[1], right))
+            if rows.start < rows.stop and cols.start < cols.stop:
+                window[rows.start - top:rows.stop - top, cols.start - left:cols.stop - left] = \
+                    tile[rows.start - r0:rows.stop - r0, cols.start - c0:cols.stop - c0]
+        return window
+
+    def min_open_value(self) -> int:
+        """Returns the smallest value of the cells that are not walls (-1), reading the map a band of rows at a time."""
+        lowest = None
+        for top in range(0, self.shape[0], self.tile_size):
+            band = self.window(top, min(top + self.tile_size, self.shape[0]), 0, self.shape[1])
+            open_cells = band[band != -1]
+            if open_cells.size and (lowest is None or open_cells.min() < lowest):
+                lowest = int(open_cells.min())
+        if lowest is None:
+            raise ValueError(self.path + ' has no open cells')
+        return lowest
+
+    def _tile(self, tile_row: int, tile_col: int) -> np.ndarray:
+        """Returns a tile, reading it from the file if it is not in memory."""
+        key = (tile_row, tile_col)
+        if key == self._last_key:
+            return self._last_tile
+        tile = self.changed_tiles.get(key)
+        if tile is None:
+            tile = self.tiles.get(key)
+            if tile is None:
+                size = self.tile_size
+                tile = np.array(self.file[tile_row*size:(tile_row + 1)*size, tile_col*size:(tile_col + 1)*size])
+                self.loads += 1
+                self.tiles[key] = tile
+                if len(self.tiles) > self.max_tiles:
+                    self.tiles.popitem(last=False)
+            else:
+                self.tiles.move_to_end(key)
+        self._last_key, self._last_tile = key, tile
+        return tile
+
+
+class _Row:
+    """A row of a TiledGrid, for grid[row][col]."""
+    def __init__(self, grid: TiledGrid, row: int) -> None:
+        self.grid = grid
+        self.row = row
+
+    def __getitem__(self, col: int) -> int:
+        return self.grid[self.row, col]
+
+    def __setitem__(self, col: int, value: int):
+        self.grid[self.row, col] = value
+
+
+class TiledMap(Map_Obj):
+    # Searches on a tiled map only keep state for the cells they touch
+    sparse_search = True
+
+    def __init__(self, path: str, start_pos: list[int, int], goal_pos: list[int, int],
+                 end_goal_pos: list[int, int] = None, tile_size: int = 256, max_tiles: int = 64) -> None:
+        """
+        Initializes a map object on a map that is too large to load at once, reading it in tiles (see TiledGrid). \\
+        The cell search of AStar (not use_graph) works on it as on any Map_Obj, and keeps its state in dictionaries
+        instead of arrays over the whole map. Use headless=True, since drawing needs the whole string map, and so do
+        the neighbor tables of get_neighbor_graph. \\
+        params:
+            - path:
+                - the binary map file. A CSV map is converted to one (next to it) first.
+            - start_pos, goal_pos, end_goal_pos:
+                - the positions, as for Map_Obj.from_array.
+            - tile_size, max_tiles:
+                - the size of the tiles, and the number of them to keep in memory, see TiledGrid.
+        """
+        binary = map_format.binary_path(path)
+        if path != binary and not (os.path.exists(binary) and os.path.getmtime(binary) >= os.path.getmtime(path)):
+            map_format.convert_csv(path, binary)
+        self.start_pos = [int(v) for v in start_pos]
+        self.goal_pos = [int(v) for v in goal_pos]
+        self.end_goal_pos = [int(v) for v in (goal_pos if end_goal_pos is None else end_goal_pos)]
+        self.path_to_map = binary
+        self._init_map(TiledGrid(binary, tile_size, max_tiles))
+
+    def _find_min_cost(self) -> int:
+        return self.int_map.min_open_value()
+
+    def get_neighbor_graph(self, connectivity: int = 4):
+        raise ValueError('a tiled map has no neighbor table, use the cell search (use_graph=False) instead')
+
+
+if __name__ == "__main__":
+    import contextlib
+    import io
+    import tempfile
+    import time
+    import tracemalloc
+    from a_star import AStar
+    from benchmark import scaled_map
+
+    # A search on a map 100 times the size of the Edgar map, read in tiles, compared to the map in memory
+    grid, start, goal = scaled_map(100)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'large' + map_format.EXTENSION)
+        map_format.write_map(path, grid)
+        for name, make_map in (('in memory', lambda: Map_Obj.from_array(grid.copy(), start, goal)),
+                               ('tiled', lambda: TiledMap(path, start, goal, tile_size=128, max_tiles=32))):
+            tracemalloc.start()
+            t0 = time.perf_counter()
+            search = AStar(make_map(), 8, headless=True)
+            with contextlib.redirect_stdout(io.StringIO()):
+                stats = search.find_shortest_path('euclidean', 1.5)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            tiles = f", {search.map.int_map.loads} tiles read" if name == 'tiled' else ''
+            print(f"{name:>9}: cost {stats.cost}, {stats.expanded} expanded, {time.perf_counter() - t0:.1f} s, "
+                  f"peak {peak / 2**20:.0f} MiB{tiles}")
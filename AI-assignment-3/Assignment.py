@@ -276,12 +276,141 @@ class CSP:
         return revised
 
 
-def create_map_coloring_csp():
+class BitmaskCSP(CSP):
+    """A CSP with the same interface as `CSP`, that searches with the
+    domains stored as integer bitmasks instead of lists.
+
+    Bit k of a domain is set if the k-th value of the CSP (in the order
+    the values were first added) is still legal. The constraints are
+    compiled into support masks when the search starts: the mask of
+    (i, j, x) has the bits of the values of j that are legal together
+    with value x of i. A revision is then a bitwise AND per value, MRV
+    counts bits, and a search node only copies a list of integers.
+    """
+
+    def backtracking_search(self) -> dict[str, list] | bool:
+        """This functions starts the CSP solver and returns the found
+        solution, in the same form as `CSP.backtracking_search`."""
+        self.backtrack_counter = 0
+        self.failure_counter = 0
+        self._compile()
+
+        # Reduce domain by inference
+        domains = list(self.masks)
+        if not all(domains) or not self._propagate(domains, list(self.arcs)):
+            return False
+
+        result = self._backtrack(domains)
+        if not result:
+            return False
+        return {var: [self.values[mask.bit_length() - 1]]
+                for var, mask in zip(self.variables, result)}
+
+    def _compile(self):
+        """Number the values and variables, and turn the domains and
+        constraints into bitmasks."""
+        self.values = []
+        bits = {}
+        for var in self.variables:
+            for value in self.domains[var]:
+                if value not in bits:
+                    bits[value] = len(self.values)
+                    self.values.append(value)
+        index = {var: i for i, var in enumerate(self.variables)}
+        self.masks = [sum(1 << bits[value] for value in set(self.domains[var]))
+                      for var in self.variables]
+
+        # supports[i][j][x]: mask of the values of j legal with value x of i
+        self.supports = [{} for _ in self.variables]
+        for i, var in enumerate(self.variables):
+            for other, pairs in self.constraints[var].items():
+                support = [0] * len(self.values)
+                for x, y in pairs:
+                    support[bits[x]] |= 1 << bits[y]
+                self.supports[i][index[other]] = support
+        # Number of legal value pairs of every value of every variable, for LCV
+        self.pair_counts = [[sum(support[x].bit_count() for support in self.supports[i].values())
+                             for x in range(len(self.values))] for i in range(len(self.variables))]
+        self.arcs = [(i, j) for i in range(len(self.variables)) for j in self.supports[i]]
+        # Arcs (k, i) to revise when the domain of i changes
+        self.incoming = [[(k, i) for k in self.supports[i]] for i in range(len(self.variables))]
+
+    def _backtrack(self, domains: list[int]) -> list[int] | bool:
+        """Recursive backtracking, see `CSP.backtrack`."""
+        # Minimum remaining values: the unassigned variable with the fewest bits set
+        var, size = -1, 0
+        for i, mask in enumerate(domains):
+            count = mask.bit_count()
+            if count > 1 and (var == -1 or count < size):
+                var, size = i, count
+        if var == -1:
+            return domains
+
+        self.backtrack_counter += 1
+        for bit in self._order_values(domains, var):
+            new_domains = domains.copy()
+            new_domains[var] = bit
+            # Only the arcs into var can have lost their support
+            if self._propagate(new_domains, list(self.incoming[var])):
+                result = self._backtrack(new_domains)
+                if result:
+                    return result
+
+        self.failure_counter += 1
+        return False
+
+    def _order_values(self, domains: list[int], var: int) -> list[int]:
+        """Least-constraining-value, like `CSP.order_variable_domain`:
+        the values of var (as single bit masks), sorted by their number
+        of legal value pairs."""
+        bits = []
+        mask = domains[var]
+        while mask:
+            bit = mask & -mask
+            mask ^= bit
+            bits.append(bit)
+        pairs = self.pair_counts[var]
+        return sorted(bits, key=lambda bit: pairs[bit.bit_length() - 1])[::-1]
+
+    def _propagate(self, domains: list[int], queue: list[tuple[int, int]]) -> bool:
+        """AC-3 on the bitmask domains, see `CSP.inference`."""
+        queued = set(queue)
+        while queue:
+            arc = queue.pop()
+            queued.discard(arc)
+            i, j = arc
+            if self._revise(domains, i, j):
+                if not domains[i]:
+                    return False
+                for nb in self.incoming[i]:
+                    if nb[0] != j and nb not in queued:
+                        queued.add(nb)
+                        queue.append(nb)
+        return True
+
+    def _revise(self, domains: list[int], i: int, j: int) -> bool:
+        """Removes the values of i without a legal value left in j, see
+        `CSP.revise`."""
+        support, other = self.supports[i][j], domains[j]
+        mask = kept = domains[i]
+        while mask:
+            bit = mask & -mask
+            mask ^= bit
+            if not support[bit.bit_length() - 1] & other:
+                kept ^= bit
+        if kept == domains[i]:
+            return False
+        domains[i] = kept
+        return True
+
+
+def create_map_coloring_csp(csp_class: type = CSP):
     """Instantiate a CSP representing the map coloring problem from the
     textbook. This can be useful for testing your CSP solver as you
-    develop your code.
+    develop your code. `csp_class` is the CSP class to use, e.g.
+    `BitmaskCSP`.
     """
-    csp = CSP()
+    csp = csp_class()
     states = ['WA', 'NT', 'Q', 'NSW', 'V', 'SA', 'T']
     edges = {'SA': ['WA', 'NT', 'Q', 'NSW', 'V'],
              'NT': ['WA', 'Q'], 'NSW': ['Q', 'V']}
@@ -295,7 +424,7 @@ def create_map_coloring_csp():
     return csp
 
 
-def create_sudoku_csp(filename: str) -> CSP:
+def create_sudoku_csp(filename: str, csp_class: type = CSP) -> CSP:
     """Instantiate a CSP representing the Sudoku board found in the text
     file named 'filename' in the current directory.
 
@@ -303,13 +432,15 @@ def create_sudoku_csp(filename: str) -> CSP:
     ----------
     filename : str
         Filename of the Sudoku board to solve
+    csp_class : type, optional
+        The CSP class to use, by default `CSP` (or `BitmaskCSP`)
 
     Returns
     -------
     CSP
         A CSP instance
     """
-    csp = CSP()
+    csp = csp_class()
     board = list(map(lambda x: x.strip(), open(filename, 'r')))
 
     for row in range(9):
@@ -356,17 +487,17 @@ if __name__ == "__main__":
     import time
 
 
-    def solve(name):
+    def solve(name, csp_class=CSP):
         print("=" * 25)
-        print(name)
+        print(name, csp_class.__name__)
 
         if name == "map":
-            csp = create_map_coloring_csp()
+            csp = create_map_coloring_csp(csp_class)
         else:
-            csp = create_sudoku_csp(f"{name}.txt")
-        t0 = time.time()
+            csp = create_sudoku_csp(f"{name}.txt", csp_class)
+        t0 = time.perf_counter()
         solution = csp.backtracking_search()
-        t1 = time.time()
+        t1 = time.perf_counter()
 
         if solution:
             if name == "map":
@@ -377,12 +508,13 @@ if __name__ == "__main__":
             print("No solution")
         print(f"Num backtracks: {csp.backtrack_counter}")
         print(f"Num failures: {csp.failure_counter}")
-        print(f"Calculation took {t1 - t0:.2f} seconds")
+        print(f"Calculation took {t1 - t0:.4f} seconds")
         print()
 
 
-    solve("easy")
-    solve("medium")
-    solve("hard")
-    solve("veryhard")
-    solve("map")
+    for csp_class in (CSP, BitmaskCSP):
+        solve("easy", csp_class)
+        solve("medium", csp_class)
+        solve("hard", csp_class)
+        solve("veryhard", csp_class)
+        solve("map", csp_class)